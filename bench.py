@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Benchmark every render engine over a fixed set of views
+- each case runs in its own process so peak RSS is per case
+- reports pixels/sec, iterations/sec (sum of the counts in the image),
+  peak RSS, and mp scaling against the number of producers
+- results go to a json file, --compare an older one to catch regressions
+
+$ ./bench.py -o bench.json
+$ ./bench.py -e numpy mp -s 1000x800 -i 150 1000 --compare bench.json
+
+loop and vectorize call python once per pixel, they only run at the first
+--sizes entry unless --slow-all is given
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import platform
+import resource
+import argparse
+import numpy as np
+from multiprocessing import Process, Queue
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import fractal
+import render
+import cmdline
+import deepzoom
+
+
+# name: (fractal, xmin, xmax, ymin, ymax)
+VIEWS = {
+    "full": ("mandelbrot", -2.0, 0.5, -1.2, 1.2),
+    "seahorse": ("mandelbrot", -0.7530, -0.7330, 0.0950, 0.1150),
+    "deep": ("mandelbrot", -0.743643888037151, -0.743643886037151, 0.131825903405330, 0.131825905005330),
+    "interior": ("mandelbrot", -0.5, 0.1, -0.3, 0.3),
+    "julia": ("julia", -1.5, 1.5, -1.5, 1.5),
+}
+
+ENGINES = ["loop", "vectorize", "numpy", "mp", "mariani", "cached", "deep"]
+SLOW_ENGINES = ["loop", "vectorize"]
+
+POLL = 0.5 # sec between checks that a case's process is still alive
+
+
+def frame_vectorize(xc, yc, fx_min, fy_min, fast=False):
+    """the old "n" key, np.vectorize around the per pixel function"""
+
+    fpx = fractal.mandelbrot_px if fractal.FRACTAL == "mandelbrot" else fractal.julia_px
+    fv = np.vectorize(fpx)
+    x = np.arange(fractal.MAX_X)
+    y = np.arange(fractal.MAX_Y)
+    return fv(x[:, np.newaxis], y, xc, yc, fx_min, fy_min, fast)
+
+
+def run_case(case, fast, symmetry, precision, q):
+    """child process, render one case and send back the result"""
+
+    fractal.configure(case["fractal"], case["max_cnt"], case["width"], case["height"])
+    fractal.SYMMETRY = symmetry
+    fractal.PRECISION = precision
+
+    fx_min, fx_max, fy_min, fy_max = case["view_box"]
+    xc = fractal.MAX_X / (fx_max - fx_min)
+    yc = fractal.MAX_Y / (fy_max - fy_min)
+    v = (xc, yc, fx_min, fy_min)
+
+    pool = None
+    if case["engine"] == "mp":
+        s = time.perf_counter()
+        pool = fractal.RenderPool(case["workers"])
+        case["pool_startup"] = time.perf_counter() - s
+
+    try:
+        s = time.perf_counter()
+        if case["engine"] == "vectorize":
+            a = frame_vectorize(*v, fast=fast)
+        elif case["engine"] == "deep":
+            a = fractal.frame_deep(deepzoom.View.from_box(fx_min, fx_max, fy_min, fy_max, fractal.MAX_X, fractal.MAX_Y))
+        else:
+            a = render.engine_map[case["engine"]](v, fast, pool)
+        t = time.perf_counter() - s
+    finally:
+        if pool:
+            pool.close()
+
+    pixels = fractal.MAX_X * fractal.MAX_Y
+    iters = int(a.sum())
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    case.update({
+        "sec": t,
+        "pixels_per_sec": pixels / t,
+        "iters_per_sec": iters / t,
+        "iterations": iters,
+        "peak_rss_kb": rss,
+        "peak_rss_producer_kb": rss_children,
+    })
+    q.put(case)
+
+
+def run(case, fast, symmetry=fractal.SYMMETRY, precision=fractal.PRECISION):
+    """
+run a case in a fresh process, returns the filled in case
+- a process that dies without a result (an exception, killed) gives the
+  case back with "failed" = its exit code
+    """
+
+    q = Queue()
+    p = Process(target=run_case, args=(case, fast, symmetry, precision, q))
+    p.start()
+    result = None
+    while result is None:
+        try:
+            result = q.get(timeout=POLL)
+        except queue.Empty:
+            if not p.is_alive():
+                break
+    p.join()
+
+    if result is None:
+        # the result may have come in just before the process ended
+        try:
+            result = q.get(timeout=POLL)
+        except queue.Empty:
+            result = dict(case, failed=p.exitcode)
+    return result
+
+
+def make_cases(engines, views, sizes, max_cnts, workers, slow_all=False):
+
+    cases = []
+    for engine in engines:
+        for view in views:
+            for i, (w, h) in enumerate(sizes):
+                if engine in SLOW_ENGINES and i > 0 and not slow_all:
+                    continue
+                for max_cnt in max_cnts:
+                    for n in (workers if engine == "mp" else [1]):
+                        cases.append({
+                            "engine": engine,
+                            "view": view,
+                            "fractal": VIEWS[view][0],
+                            "view_box": VIEWS[view][1:],
+                            "width": w,
+                            "height": h,
+                            "max_cnt": max_cnt,
+                            "workers": n,
+                        })
+    return cases
+
+
+def case_key(c):
+    return "{engine} {view} {width}x{height} i={max_cnt} w={workers}".format(**c)
+
+
+def print_scaling(results):
+    """mp speed up against its own 1 producer run"""
+
+    results = [r for r in results if "failed" not in r]
+    base = {}
+    for r in results:
+        if r["engine"] == "mp" and r["workers"] == 1:
+            base[(r["view"], r["width"], r["height"], r["max_cnt"])] = r["sec"]
+
+    for r in results:
+        b = base.get((r["view"], r["width"], r["height"], r["max_cnt"]))
+        if r["engine"] == "mp" and b and r["workers"] > 1:
+            print("scaling {:40} {:5.2f}x on {} producers ({:.0%} efficient)".format(
+                case_key(r), b / r["sec"], r["workers"], b / r["sec"] / r["workers"]))
+
+
+def compare(results, fname, threshold):
+    """print the change against an older results file, True if anything got slower"""
+
+    with open(fname) as f:
+        old = {case_key(r): r for r in json.load(f)["results"]}
+
+    slower = False
+    for r in results:
+        o = old.get(case_key(r))
+        if not o or "failed" in r or "failed" in o:
+            continue
+        ratio = r["sec"] / o["sec"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = " <-- slower"
+            slower = True
+        print("{:40} {:8.3f} sec was {:8.3f} sec, {:5.2f}x{}".format(case_key(r), r["sec"], o["sec"], ratio, flag))
+    return slower
+
+
+def main(argv=None):
+
+    cores = os.cpu_count()
+    default_workers = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+
+    parser = argparse.ArgumentParser(description="benchmark the fractal engines")
+    parser.add_argument("-e", "--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("-v", "--views", nargs="+", choices=sorted(VIEWS), default=list(VIEWS))
+    parser.add_argument("-s", "--sizes", nargs="+", type=cmdline.size, default=[(320, 240), (1000, 800)])
+    parser.add_argument("-i", "--iterations", nargs="+", type=int, default=[150, 1000], help="MAX_CNT values")
+    parser.add_argument("-w", "--workers", nargs="+", type=int, default=default_workers, help="mp producer counts")
+    parser.add_argument("-o", "--out", default="bench.json")
+    parser.add_argument("--fast", action="store_true", help="cardioid / bulb / periodicity shortcuts")
+    parser.add_argument("--symmetry", action="store_true", help="mirror symmetric halves")
+    parser.add_argument("--precision", choices=fractal.PRECISIONS, default=fractal.PRECISION, help="array engine float type")
+    parser.add_argument("--slow-all", action="store_true", help="run loop and vectorize at every size")
+    parser.add_argument("--compare", help="older results json")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slow down that counts as a regression")
+    args = parser.parse_args(argv)
+
+    cases = make_cases(args.engines, args.views, args.sizes, args.iterations, args.workers, args.slow_all)
+    print("{} cases, {} cores".format(len(cases), cores))
+
+    results = []
+    for case in cases:
+        r = run(case, args.fast, args.symmetry, args.precision)
+        results.append(r)
+        if "failed" in r:
+            print("{:40} FAILED, exit code {}".format(case_key(r), r["failed"]), flush=True)
+            continue
+        print("{:40} {:8.3f} sec {:12,.0f} pixels/sec {:14,.0f} iters/sec {:8,} KB".format(
+            case_key(r), r["sec"], r["pixels_per_sec"], r["iters_per_sec"], r["peak_rss_kb"]), flush=True)
+
+    print_scaling(results)
+
+    meta = {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cores": cores,
+        "fast": args.fast,
+        "symmetry": args.symmetry,
+        "precision": args.precision,
+    }
+    with open(args.out, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=1)
+    print("saved {}".format(args.out))
+
+    failed = [r for r in results if "failed" in r]
+    if failed:
+        print("{} of {} cases failed".format(len(failed), len(results)))
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
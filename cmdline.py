@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+argparse types shared by the command line scripts
+- no imports beyond the standard library, so the small scripts (fern.py,
+  gosper.py) don't pull in the fractal engines to read their arguments
+
+    parser.add_argument("-s", "--size", type=cmdline.size)
+"""
+
+
+def size(s):
+    """WIDTHxHEIGHT"""
+
+    w, h = s.lower().split("x")
+    return int(w), int(h)
+
+
+def number(s):
+    """a number kept as text, so deep views don't lose digits"""
+
+    float(s)
+    return s
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Deep zoom, perturbation theory
+https://en.wikipedia.org/wiki/Plotting_algorithms_for_the_Mandelbrot_set#Perturbation_theory_and_series_approximation
+
+floats run out after ~1e-13 units per pixel, the picture turns into blocks
+- only the view center is kept at high precision (decimal.Decimal)
+- one reference orbit Z is computed at the center with Decimal
+- every pixel iterates its float64 difference d from the reference
+    mandelbrot: d' = 2 Z d + d^2 + dc   (dc = pixel - center, d0 = 0)
+    julia:      d' = 2 Z d + d^2        (d0 = pixel - center)
+- glitches: when |Z + d| < |d| the pixel is rebased onto the start of the
+  reference orbit (d = Z + d, restart at Z0), same when the reference
+  escapes early. No second reference or glitch pass is needed.
+- pixel size stays a float, good down to ~1e-300
+"""
+
+import math
+import decimal
+from decimal import Decimal
+import numpy as np
+
+
+def plain(v):
+    """Decimal as a plain number with all its digits, no trailing zeros"""
+
+    s = "{:f}".format(v)
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+    return s
+
+
+class View:
+    """
+high precision view, center (Decimal) and units per pixel (float)
+    """
+
+    def __init__(self, cx, cy, dx, dy):
+        self.cx = Decimal(cx)
+        self.cy = Decimal(cy)
+        self.dx = float(dx)
+        self.dy = float(dy)
+
+    @classmethod
+    def from_box(cls, fx_min, fx_max, fy_min, fy_max, w, h):
+        """view from corners, floats or strings (strings keep all their digits)"""
+
+        fx_min, fx_max, fy_min, fy_max = (Decimal(v) for v in (fx_min, fx_max, fy_min, fy_max))
+        with decimal.localcontext() as ctx:
+            ctx.prec = max(40, len(str(fx_min)), len(str(fy_min)))
+            cx = (fx_min + fx_max) / 2
+            cy = (fy_min + fy_max) / 2
+            dx = (fx_max - fx_min) / w
+            dy = (fy_max - fy_min) / h
+        return cls(cx, cy, dx, dy)
+
+    def digits(self):
+        """decimal digits needed to tell pixels apart at this zoom"""
+
+        return max(20, int(-math.log10(min(self.dx, self.dy))) + 12)
+
+    def zoom(self, sx0, sy0, sx1, sy1, w, h):
+        """
+new view for a screen selection (pixels, x0 <= x1, y0 <= y1)
+- an empty selection leaves that axis as it was, like fractal()
+        """
+
+        cx, cy, dx, dy = self.cx, self.cy, self.dx, self.dy
+
+        with decimal.localcontext() as ctx:
+            ctx.prec = self.digits() + 5
+            if sx1 > sx0:
+                cx = self.cx + Decimal((sx0 + sx1) / 2 - w / 2) * Decimal(self.dx)
+                dx = self.dx * (sx1 - sx0) / w
+            if sy1 > sy0:
+                cy = self.cy + Decimal((sy0 + sy1) / 2 - h / 2) * Decimal(self.dy)
+                dy = self.dy * (sy1 - sy0) / h
+
+        return View(cx, cy, dx, dy)
+
+    def box(self, w, h):
+        """float corners fx_min, fx_max, fy_min, fy_max, only exact while shallow"""
+
+        cx = float(self.cx)
+        cy = float(self.cy)
+        return cx - w / 2 * self.dx, cx + w / 2 * self.dx, cy - h / 2 * self.dy, cy + h / 2 * self.dy
+
+    def __str__(self):
+        return "center {}, {} / {:.3e} per pixel".format(plain(self.cx), plain(self.cy), self.dx)
+
+
+def reference_orbit(zr, zi, cr, ci, max_cnt, radius, digits):
+    """
+orbit of z = z^2 + c with Decimal, as complex128
+- stops once |z| > radius, the escaped value is not kept
+    """
+
+    orbit = np.zeros(max_cnt + 1, dtype=np.complex128)
+    r2 = Decimal(radius * radius)
+
+    with decimal.localcontext() as ctx:
+        ctx.prec = digits
+        zr, zi = +Decimal(zr), +Decimal(zi)
+        cr, ci = Decimal(cr), Decimal(ci)
+
+        n = 0
+        while n <= max_cnt:
+            if zr*zr + zi*zi > r2:
+                break
+            orbit[n] = complex(float(zr), float(zi))
+            zr, zi = zr*zr - zi*zi + cr, 2*zr*zi + ci
+            n += 1
+
+    return orbit[:n]
+
+
+def reference(fractal, view, max_cnt, c=None, zmax=10):
+    """reference orbit at the view center, mandelbrot starts at 0, julia at the center"""
+
+    if fractal == "mandelbrot":
+        return reference_orbit(0, 0, view.cx, view.cy, max_cnt, 2.0, view.digits())
+
+    orbit = reference_orbit(view.cx, view.cy, c.real, c.imag, max_cnt, zmax, view.digits())
+    if orbit.size == 0:
+        # center already outside the radius, the pixels still need a start
+        orbit = np.array([complex(float(view.cx), float(view.cy))])
+    return orbit
+
+
+def perturb(fractal, px, py, view, w, h, max_cnt, c=None, zmax=10, orbit=None, stats=None):
+    """
+iteration counts for pixels px, py (broadcast arrays) of a w x h screen
+- fractal = "mandelbrot" (escape |z| > 2) or "julia" (|z| > zmax, constant c)
+- orbit = reference() for this view, computed when not given
+- stats = dict, reference length and rebases are added up in it
+    """
+
+    if orbit is None:
+        orbit = reference(fractal, view, max_cnt, c, zmax)
+
+    radius = 2.0 if fractal == "mandelbrot" else float(zmax)
+    r2 = radius * radius
+
+    px, py = np.broadcast_arrays(px, py)
+    shape = px.shape
+    cnt = np.full(px.size, max_cnt, dtype=np.int32)
+    idx = np.arange(px.size)
+
+    # pixel offset from the center, small enough for float64 at any zoom
+    ox = ((px - w / 2) * view.dx).ravel()
+    oy = ((py - h / 2) * view.dy).ravel()
+
+    if fractal == "mandelbrot":
+        dx, dy = np.zeros_like(ox), np.zeros_like(oy)
+        cx, cy = ox, oy
+    else:
+        dx, dy = ox, oy
+        cx, cy = 0.0, 0.0
+
+    zr = orbit.real.copy()
+    zi = orbit.imag.copy()
+    zr0, zi0 = zr[0], zi[0]
+    last = orbit.size - 1
+    m = None # every pixel is at orbit[i] until the first rebase, no gather needed
+    rebases = 0
+
+    for i in range(max_cnt):
+        if m is None:
+            ar, ai = zr[i], zi[i]
+        else:
+            ar, ai = zr[m], zi[m]
+        x = ar + dx
+        y = ai + dy
+        zz = x*x + y*y
+
+        live = zz <= r2
+        if not live.all():
+            # escaped pixels drop out of the work
+            cnt[idx[~live]] = i
+            idx = idx[live]
+            x, y, zz, dx, dy = x[live], y[live], zz[live], dx[live], dy[live]
+            if m is not None:
+                ar, ai, m = ar[live], ai[live], m[live]
+            if fractal == "mandelbrot":
+                cx, cy = cx[live], cy[live]
+            if idx.size == 0:
+                break
+
+        # glitch or end of the reference, carry on from the start of the orbit
+        rb = zz < dx*dx + dy*dy
+        if i >= last:
+            rb |= (i == last) if m is None else (m == last)
+        r = np.flatnonzero(rb)
+        if r.size:
+            if m is None:
+                m = np.full(idx.size, i)
+                ar = np.full(idx.size, ar)
+                ai = np.full(idx.size, ai)
+            rebases += r.size
+            dx[r] = x[r] - zr0
+            dy[r] = y[r] - zi0
+            ar[r] = zr0
+            ai[r] = zi0
+            m[r] = 0
+
+        # d' = (2 Z + d) d + dc
+        tr = 2*ar + dx
+        ti = 2*ai + dy
+        dx, dy = tr*dx - ti*dy + cx, tr*dy + ti*dx + cy
+        if m is not None:
+            m += 1
+
+    if stats is not None:
+        stats["reference"] = orbit.size
+        stats["rebases"] = stats.get("rebases", 0) + rebases
+
+    return cnt.reshape(shape)
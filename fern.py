@@ -4,16 +4,48 @@
 """
 Barnsley Fern
 - very slow to iterate through it??
+  - one point per frame at 90 frames/sec, yes
+- ChaosGame moves a whole batch of points (WALKERS) per step as numpy
+  arrays, every point picks its map from one vectorized random draw
+- hits are added up in a density array the size of the screen, shaded
+  and blitted once per frame, memory stays the same however long it runs
+- other IFS come from yaml files (ifs/*.yaml), see load_ifs()
+
+$ ./fern.py                        window, the fern
+$ ./fern.py ifs/dragon.yaml        window, any IFS fitted to the screen
+$ ./fern.py ifs/*.yaml -n 3e8 -o "out/{name}.png"
+                                   no window, one image per file
 
 """
 import sys
 import os
+import time
+import glob
+import argparse
 import pygame
 from pygame.locals import *
-import functools
 import random
 import yaml
 import math
+import numpy as np
+import palette
+import cmdline
+
+
+# affine maps, (probability, a, b, c, d, e, f)
+# x' = a x + b y + e, y' = c x + d y + f
+FERN = [
+    (0.01, 0.0, 0.0, 0.0, 0.16, 0.0, 0.0),
+    (0.85, 0.85, 0.04, -0.04, 0.85, 0.0, 1.6),
+    (0.07, 0.2, -0.26, 0.23, 0.22, 0.0, 1.6),
+    (0.07, -0.15, 0.28, 0.26, 0.24, 0.0, 0.44),
+]
+
+WALKERS = 100000 # points moved together
+STEPS = 20 # steps per frame, WALKERS * STEPS points
+BURN_IN = 20 # steps before a walker is on the fern and gets drawn
+MAP_KEYS = ("a", "b", "c", "d", "e", "f")
+
 
 def init_screen():
     """initalize screen"""
@@ -21,19 +53,20 @@ def init_screen():
 
     screen_x = 1000
     screen_y = 700
-        
+
     screen = pygame.display.set_mode((screen_x, screen_y), HWSURFACE|HWPALETTE, 8)
-    
+
     pygame.display.set_caption("Fern Fractal")
 
     pygame.mouse.set_visible(False)
-    
+
     pygame.display.set_allow_screensaver(False)
 
     return screen, screen_x, screen_y
 
-@functools.cache
+
 def barnsley_fern(x,y):
+    """one step of one point, ChaosGame does the same for a whole batch"""
     #xn = yn = 0.0
     r = random.random()
 
@@ -50,52 +83,196 @@ def barnsley_fern(x,y):
     else:
         xn = -0.15 * x + 0.28 * y
         yn = 0.26 * x + 0.24 * y + 0.44
-        
+
     return xn, yn
 
 
+class ChaosGame:
+    """
+iterated function system, a batch of points at a time
+- maps = [(probability, a, b, c, d, e, f), ...] like FERN
+- every step each walker takes a map picked by its own random number,
+  the coefficients are gathered per walker and applied as arrays
+- hits land in density (w, h), pixel = (x * scale + ox, y * scale + oy)
+  or oy - y * scale with flip, see fit()
+    """
+
+    def __init__(self, maps, w, h, scale=50, ox=450, oy=100, walkers=WALKERS, seed=None):
+        m = np.array(maps, dtype=np.float64)
+        self.cum = np.cumsum(m[:, 0])
+        self.cum /= self.cum[-1]
+        self.coef = m[:, 1:].T.copy() # a, b, c, d, e, f rows
+        self.w = w
+        self.h = h
+        self.scale = scale
+        self.ox = ox
+        self.oy = oy
+        self.rng = np.random.default_rng(seed)
+        self.x = self.rng.random(walkers)
+        self.y = self.rng.random(walkers)
+        self.flip = False # y up instead of the screen's y down
+        self.density = np.zeros((w, h), dtype=np.int64)
+        self.points = 0
+
+        # the starting points are anywhere, let them settle on the fractal
+        for i in range(BURN_IN):
+            self.move()
+
+    def move(self):
+        """every walker takes one map"""
+
+        k = np.searchsorted(self.cum, self.rng.random(self.x.size), side="right")
+        np.minimum(k, self.cum.size - 1, out=k)
+        a, b, c, d, e, f = self.coef[:, k]
+        self.x, self.y = a * self.x + b * self.y + e, c * self.x + d * self.y + f
+
+    def step(self, n=STEPS):
+        """n moves, every point is added to the density"""
+
+        for i in range(n):
+            self.move()
+            px = (self.x * self.scale + self.ox).astype(np.intp)
+            if self.flip:
+                py = (self.oy - self.y * self.scale).astype(np.intp)
+            else:
+                py = (self.y * self.scale + self.oy).astype(np.intp)
+            ok = (px >= 0) & (px < self.w) & (py >= 0) & (py < self.h)
+            hits = np.bincount(px[ok] * self.h + py[ok], minlength=self.w * self.h)
+            self.density += hits.reshape(self.w, self.h)
+            self.points += self.x.size
+
+    def shade(self):
+        """density as uint8, log scaled so single hits still show"""
+
+        top = self.density.max()
+        if top == 0:
+            return np.zeros((self.w, self.h), dtype=np.uint8)
+        return (np.log1p(self.density) * (255 / math.log1p(top))).astype(np.uint8)
+
+    def fit(self, margin=0.05):
+        """scale and origin that fit the walkers' bounding box in w x h, y up"""
+
+        x0, x1 = self.x.min(), self.x.max()
+        y0, y1 = self.y.min(), self.y.max()
+        self.scale = min(self.w * (1 - 2 * margin) / max(x1 - x0, 1e-12),
+                         self.h * (1 - 2 * margin) / max(y1 - y0, 1e-12))
+        self.ox = self.w / 2 - (x0 + x1) / 2 * self.scale
+        self.oy = self.h / 2 + (y0 + y1) / 2 * self.scale
+        self.flip = True
+
+
+def load_ifs(fname):
+    """
+IFS from a yaml file, returns (name, maps), maps like FERN
+- name: title, maps: list of {p, a, b, c, d, e, f}
+- a map without p gets a chance from its area |a d - b c| (at least 1%)
+    """
+
+    with open(fname) as f:
+        data = yaml.safe_load(f)
+
+    maps = []
+    for m in data["maps"]:
+        missing = [k for k in MAP_KEYS if k not in m]
+        if missing:
+            raise ValueError("{}: map without {}".format(fname, ", ".join(missing)))
+        maps.append([m.get("p")] + [float(m[k]) for k in MAP_KEYS])
+
+    if any(m[0] is None for m in maps):
+        area = [max(abs(a * d - b * c), 0.01) for p, a, b, c, d, e, f in maps]
+        for m, w in zip(maps, area):
+            m[0] = w if m[0] is None else m[0]
+
+    name = data.get("name", os.path.splitext(os.path.basename(fname))[0])
+    return name, [tuple(m) for m in maps]
+
+
+def save(game, out, name="grey"):
+    """density to out, .png shaded through a palette, .npy the raw hits"""
+
+    d = os.path.dirname(out)
+    if d:
+        os.makedirs(d, exist_ok=True)
+
+    ext = os.path.splitext(out)[1].lower()
+    if ext == ".npy":
+        np.save(out, game.density)
+    elif ext == ".png":
+        rgb = palette.make_lut(name)[game.shade()]
+        pygame.image.save(pygame.surfarray.make_surface(rgb), out)
+    else:
+        raise ValueError("unknown output type: {}".format(out))
+
+
+def render(fname, out, points, w, h, name="grey", seed=None):
+    """one IFS file to an image without a window, returns points/sec"""
+
+    title, maps = load_ifs(fname)
+    game = ChaosGame(maps, w, h, seed=seed)
+    game.fit()
+
+    s = time.perf_counter()
+    while game.points < points:
+        game.step(min(STEPS, -(-(points - game.points) // game.x.size)))
+    t = time.perf_counter() - s
+
+    save(game, out, name)
+    print("{}: {} {:,} points, {:.2f} sec, {:,.0f} points/sec, {:.1f} MB".format(
+        out, title, game.points, t, game.points / t, game.density.nbytes / 1024 / 1024))
+    return game.points / t
+
+
+def fern(screen, screen_x, screen_y, maps=None):
+    """chaos game in a window, maps = an IFS fitted to the screen, default the fern"""
 
-def fern(screen, screen_x, screen_y):
-    
     background_color = (0,0,0)
     done = False
 
     bg = pygame.Surface(screen.get_size())
     bg = bg.convert()
 
-    clock_tick = 90 # higher = faster
+    clock_tick = 30 # frames, the points per frame are game.step()
     clock = pygame.time.Clock()
 
-    redraw_flag = True
-    x = 0.0
-    y = 0.0
-
     bg.fill(background_color)
-    cnt = 0
+
+    if maps:
+        game = ChaosGame(maps, screen_x, screen_y)
+        game.fit()
+    else:
+        game = ChaosGame(FERN, screen_x, screen_y)
+    rgb = np.zeros((screen_x, screen_y, 3), dtype=np.uint8)
+
+    s = time.perf_counter()
+    shown = 0
 
     while not done:
 
-        #r = random.random()
-        #xn = yn = 0.0
-        x, y = barnsley_fern(x,y)
-        
-        #print(f"{x:.2f}, {y:.2f}")
-        xt = int(450 + x*50)
-        yt = int(y*50 + 100)
-        bg.set_at((xt, yt), (0,255,0))
-        bg.set_at((xt-250,yt), (255,0,0))
-        bg.set_at((xt+250,yt), (0,0,255))
-        cnt += 1
+        game.step()
+
+        g = game.shade()
+        if maps:
+            rgb[...] = g[:, :, np.newaxis]
+        else:
+            # the fern in green, a red copy 250 to the left and a blue one to the right
+            rgb[:, :, 1] = g
+            rgb[:screen_x - 250, :, 0] = g[250:]
+            rgb[250:, :, 2] = g[:screen_x - 250]
+        pygame.surfarray.blit_array(bg, rgb)
+
+        screen.blit(bg, (0, 0))
+        pygame.display.flip()
+
+        t = time.perf_counter() - s
+        if t > 1:
+            print("- {:,} points, {:,.0f} points/sec".format(game.points, (game.points - shown) / t))
+            s = time.perf_counter()
+            shown = game.points
+
+        clock.tick(clock_tick)
 
-        if cnt % 50 == 0:
-            print(f"- iteration {cnt}")
-            screen.blit(bg, (0, 0))
-            pygame.display.flip()
 
-        clock.tick(clock_tick) 
 
-        
-        
 
         for event in pygame.event.get():
             if event.type == QUIT:
@@ -103,19 +280,44 @@ def fern(screen, screen_x, screen_y):
             elif event.type == KEYDOWN:
 
                 if event.key == K_ESCAPE:
-                    done = True            
+                    done = True
 
                 if event.key == K_RETURN:
                     done = True
 
-if __name__ == '__main__':
 
-    print("[ Fern Fractal ]".center(60, "-"))
-    # full screen option
-    screen, screen_x, screen_y = init_screen()
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="chaos game IFS, window or images")
+    parser.add_argument("files", nargs="*", help="IFS yaml files, default the fern (window) or ifs/*.yaml (-o)")
+    parser.add_argument("-o", "--out", help="no window, output per file, {name} = file name, .png or .npy")
+    parser.add_argument("-n", "--points", type=float, default=1e8, help="points per image")
+    parser.add_argument("-s", "--size", type=cmdline.size, default=(1000, 1000), help="WIDTHxHEIGHT of the images")
+    parser.add_argument("--palette", choices=sorted(palette.PALETTES), default="grey", help="for .png")
+    parser.add_argument("--seed", type=int, help="random seed, same images every run")
+    args = parser.parse_args(argv)
+
+    if not args.out:
+        print("[ Fern Fractal ]".center(60, "-"))
+        maps = load_ifs(args.files[0])[1] if args.files else None
+        # full screen option
+        screen, screen_x, screen_y = init_screen()
+
+        fern(screen, screen_x, screen_y, maps)
+
+        pygame.quit()
+        return
+
+    files = args.files or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ifs", "*.yaml")))
+    s = time.perf_counter()
+    for fname in files:
+        name = os.path.splitext(os.path.basename(fname))[0]
+        render(fname, args.out.format(name=name), int(args.points), *args.size, args.palette, args.seed)
+    print("{} images: {:.2f} sec".format(len(files), time.perf_counter() - s))
+
+
+if __name__ == '__main__':
 
-    fern(screen, screen_x, screen_y)
+    main()
 
-    pygame.quit()
-    
-    sys.exit(0)
\ No newline at end of file
+    sys.exit(0)
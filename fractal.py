@@ -16,21 +16,59 @@ https://scipython.com/book/chapter-7-matplotlib/problems/p72/the-julia-set/
 
 
 threads share memory, processes do not share memory
-- producers cannot access shared memory
-- multiprocess.queue must be used up to free multiprocess threads
+- producers write counts into a multiprocessing.shared_memory buffer
+- the frame is cut into small tiles, handed out from a shared work queue
+  - most expensive first (from a coarse preview), so no producer is stuck
+    with all of the interior while the others sit idle
+- the done queue carries one message per tile with the compute time
+- producers are started once (RenderPool) and reused for every "p" render
 
 numpy test
 - vectorizing function doesn't help much - 17 sec vs 20 for the loop
 - colors using surfarray are odd - can we define what color maps to what value?
+  - yes, counts go through a palette lookup table (palette.py), one numpy
+    index per piece, the Canvas keeps the counts so cycling is only a recolor
 - other numpy fractal examples use complex numbers - faster but 800k points?
+- mandelbrot_np / julia_np iterate the whole frame as arrays instead
+  - only pixels still inside the escape radius are iterated each pass
+  - counts match mandelbrot_px / julia_px exactly, julia frame < 1 sec
 
 
 r = reset to normal coordinates
 s = redraw in normal mode
 p = redraw in threaded/multiprocessing mode
-n = use numpy
+n = use numpy (whole frame array engine)
+m = redraw with mariani-silver, only borders of same count areas are computed
+g = progressive mode, 1/16 then 1/4 then full resolution
+    - redraws as soon as a mouse selection is made, no need to press a key
+d = deep zoom, perturbation from a high precision reference orbit
+    - keeps working past ~1e-13 per pixel, where the other modes turn blocky
+c = redraw from the tile cache, areas already seen at this zoom are reused
+    - zooming back with "r" or to an earlier view costs almost nothing
+t = toggle timing, per stage times / counters printed after every render
+    and a chrome trace saved to TRACE_FILE (chrome://tracing, ui.perfetto.dev)
+f = toggle fast path: cardioid / bulb test and periodicity check, same counts
+l = next palette, the picture is recolored without computing it again
+e = toggle histogram equalized colors, every color gets about the same
+    number of pixels, the histogram is added up while the tiles come in
+o = toggle smooth coloring, fractional counts instead of bands (numpy and g)
+space = palette cycling on / off, left / right arrow = one step
+y = toggle symmetry (off by default), a view across the real axis
+    (mandelbrot) or around the origin (julia) computes one half and mirrors
+    the other, a few pixels can differ from computing them at high MAX_CNT
+b = precision of the array engines, float64 / auto / float32, float64 by
+    default (counts match the per pixel functions), auto is float32 (about
+    twice as fast) until the zoom nears float32 epsilon, every float32
+    render prints how many pixels differ from float64
+a = toggle automatic MAX_CNT, the cap is picked for every render from the
+    zoom and a sparse sample pass, deeper views get more iterations
 
 use mouse selection to select area to zoom in, then click "s" or "p"
+(in progressive mode the zoom is drawn on release)
+
+renders run in a background thread (RenderJob), finished pieces are drawn
+by the event loop so the window stays responsive
+- a new selection, reset or redraw cancels the render that's running
 
 esc to exit
 
@@ -45,11 +83,17 @@ no fractal ~ 2 sec
 
 import sys
 import math
+import atexit
 import pygame
 import time
 import numpy as np
-from threading import Thread
-from multiprocessing import Process, Queue, cpu_count
+import queue
+import timing
+import palette
+import deepzoom
+from collections import OrderedDict
+from threading import Thread, Event, Lock
+from multiprocessing import Process, Queue, Value, cpu_count, shared_memory
 from pygame.locals import *
 import pygame.gfxdraw
 
@@ -64,11 +108,108 @@ FRACTAL="julia"
 MAX_X = 1000
 MAX_Y = 800
 
-def julia_px(px, py, xc, yc, fx_min, fy_min):
-    """julia set fractal"""
+# parallel tiles, size in pixels and preview sample step for the cost estimate
+TILE = 40
+PREVIEW_STEP = 8
+
+# RenderPool waits for producers in steps of POOL_POLL sec, checking they
+# are still alive, and gives up on startup after POOL_START_SEC.  On close
+# a producer gets POOL_CLOSE_SEC to finish its tile before it is killed
+POOL_POLL = 0.1
+POOL_START_SEC = 30
+POOL_CLOSE_SEC = 2
+
+# progressive passes, pixel step of each pass
+PROGRESSIVE_STEPS = (4, 2, 1)
+
+# mariani-silver, rectangles this size or smaller are computed in full
+MS_MIN = 10
+
+# tile cache, tile size in pixels and memory budget
+CACHE_TILE = 64
+CACHE_MB = 256
+
+# chrome trace written after every render when timing is on ("t")
+TRACE_FILE = "fractal_trace.json"
+
+# coloring, palette.PALETTES name, smooth fractional counts ("o" key),
+# histogram equalized colors ("e") and lut entries per frame when cycling (space)
+PALETTE = "grey"
+SMOOTH = False
+EQUALIZE = False
+EQUALIZE_SEC = 0.1 # recolor at most this often while an equalized render comes in
+CYCLE_STEP = 2
+
+# compute one half of a view that is symmetric, mirror the other ("y" key).
+# Off by default, partners only match to a millionth of a pixel so the counts
+# aren't exactly the ones of mandelbrot_px / julia_px, see symmetry()
+SYMMETRY = False
+
+# float type of the array engines ("b" key), "float64", "auto" or "float32"
+# - float64 gives the same counts as mandelbrot_px / julia_px
+# - auto = float32 while a pixel is at least F32_MARGIN float32 steps wide
+#   at |z| = 2, float64 from there on.  Faster, a few pixels per view differ
+PRECISION = "float64"
+PRECISIONS = ("float64", "auto", "float32")
+F32_MARGIN = 1024
+
+# anti-aliasing (render.py --aa), pixels whose count is more than
+# AA_THRESHOLD from a neighbour's get AA_SAMPLES x AA_SAMPLES samples,
+# averaged evenly ("box") or weighted by a gaussian of AA_SIGMA pixels
+AA_SAMPLES = 4
+AA_THRESHOLD = 1
+AA_FILTER = "box"
+AA_SIGMA = 0.5
+
+# automatic MAX_CNT ("a" key), see auto_max_cnt()
+# - sample grid step in pixels, the cap is doubled until a doubling changes
+#   fewer than AUTO_CHANGE of the samples
+# - the first guess is AUTO_MIN + AUTO_PER_DECADE per 10x of zoom
+AUTO_STEP = 16
+AUTO_CHANGE = 0.001
+AUTO_MIN = 50
+AUTO_MAX = 100000
+AUTO_PER_DECADE = 100
+
+# julia set constant and escape radius
+JULIA_C = complex(-0.1, 0.65)
+JULIA_ZMAX = 10
+
+# pixels skipped by the fast path (fast=True), see interior() and periodicity
+FAST_STATS = {"cardioid": 0, "bulb": 0, "period": 0}
+
+
+def interior(x0, y0):
+    """
+main cardioid / period 2 bulb test for the mandelbrot set
+- "cardioid", "bulb" or None, works on floats or arrays (returns masks)
+- those points never escape so the count is always MAX_CNT
+    """
+
+    q = (x0 - 0.25)**2 + y0*y0
+    cardioid = q * (q + (x0 - 0.25)) < 0.25 * y0*y0
+    bulb = (x0 + 1)**2 + y0*y0 < 0.0625
+
+    if isinstance(cardioid, np.ndarray):
+        return cardioid, bulb & ~cardioid
+    if cardioid:
+        return "cardioid"
+    if bulb:
+        return "bulb"
+    return None
+
 
-    c = complex(-0.1, 0.65)
-    zmax = 10
+def julia_px(px, py, xc, yc, fx_min, fy_min, fast=False, c=None):
+    """
+julia set fractal
+- fast = stop as soon as the orbit repeats exactly (periodicity check),
+  the float iteration is deterministic so it can never escape after that
+- c = julia constant, default JULIA_C
+    """
+
+    if c is None:
+        c = JULIA_C
+    zmax = JULIA_ZMAX
     
     x0 = px / xc + fx_min
     y0 = py / yc + fy_min
@@ -76,19 +217,33 @@ def julia_px(px, py, xc, yc, fx_min, fy_min):
 
     cnt = 0
     z = complex(x0, y0)
+
+    # saved orbit point, replaced at iterations 1, 2, 4, 8, ...
+    zs = z
+    check = 1
+
     while abs(z) <= zmax and cnt < MAX_CNT:
         z = z**2 + c
         cnt += 1
+
+        if fast:
+            if z == zs:
+                FAST_STATS["period"] += 1
+                return MAX_CNT
+            if cnt == check:
+                zs = z
+                check *= 2
     
     return cnt
 
 
-def mandelbrot_px(px, py, xc, yc, fx_min, fy_min):
+def mandelbrot_px(px, py, xc, yc, fx_min, fy_min, fast=False):
     """
 xc = constant for converting x
 = 2.47 / max_x - 2 so range is -0.47 to 2
 yc = constant for converting y
 = 2.24 / max_y  (size of y - midpoint so y range is -1.12 to 1.12)
+fast = skip the cardioid / bulb and stop on a repeating orbit, same counts
     """
 
     #x0 = px / xc - 2
@@ -97,114 +252,1453 @@ yc = constant for converting y
     x0 = px / xc + fx_min
     y0 = py / yc + fy_min
 
+    if fast:
+        inside = interior(x0, y0)
+        if inside:
+            FAST_STATS[inside] += 1
+            return MAX_CNT
+
 
     x = 0
     y = 0
     cnt = 0
 
+    xs = ys = 0
+    check = 1
+
     while x*x + y*y <= 4 and cnt < MAX_CNT:
         xtmp = x*x - y*y + x0
         y = 2*x*y + y0
         x = xtmp
         cnt += 1
 
+        if fast:
+            if x == xs and y == ys:
+                FAST_STATS["period"] += 1
+                return MAX_CNT
+            if cnt == check:
+                xs, ys = x, y
+                check *= 2
+
     
     return cnt
 
 
-def producer(thread, thread_cnt, xc, yc, fx_min, fy_min, q):
+def float_type(xc, yc, precision=None):
+    """
+numpy float type for a view of xc, yc pixels per unit
+- precision = PRECISIONS name, default PRECISION
+- auto: float32 while a pixel is F32_MARGIN float32 steps or more at |z| = 2,
+  closer than that neighbouring pixels start to share coordinates and the
+  rounding of every iteration shows, float64 from there on
+    """
 
-    print("<p{}> started, queue_size = {}".format(thread, q.qsize()), flush=True)
-    
+    if precision is None:
+        precision = PRECISION
+    if precision == "auto":
+        f32 = min(1 / xc, 1 / yc) >= F32_MARGIN * 2 * np.finfo(np.float32).eps
+        precision = "float32" if f32 else "float64"
+    return np.float32 if precision == "float32" else np.float64
+
+
+def mandelbrot_np(px, py, xc, yc, fx_min, fy_min, max_cnt=None, fast=False, smooth=False, precision=None,
+                  counted=True):
     """
-    # striped
+mandelbrot_px for a whole array of pixels at once
+- px, py = pixel coordinate arrays, broadcast together (eg. column & row)
+- returns iteration counts with the broadcast shape
+- same float operations in the same order as mandelbrot_px so counts match
+  (in float64)
+- smooth = fractional counts instead, see smooth_counts()
+- precision = PRECISIONS name, default PRECISION, see float_type()
+- counted = add the pixels to the timing counters, off for previews, samples
+  and checks that aren't part of the frame
+    """
+
+    if max_cnt is None:
+        max_cnt = MAX_CNT
+    dtype = float_type(xc, yc, precision)
+
+    s = time.perf_counter()
+    px, py = np.broadcast_arrays(px, py)
+    shape = px.shape
+    cnt = np.full(px.size, max_cnt, dtype=np.int32)
+
+    # constants for the pixels still iterating
+    x0 = (px / xc + fx_min).ravel().astype(dtype, copy=False)
+    y0 = (py / yc + fy_min).ravel().astype(dtype, copy=False)
+    idx = np.arange(px.size)
+
+    if fast:
+        # known interior, count stays max_cnt
+        cardioid, bulb = interior(x0, y0)
+        FAST_STATS["cardioid"] += int(cardioid.sum())
+        FAST_STATS["bulb"] += int(bulb.sum())
+        keep = ~(cardioid | bulb)
+        idx, x0, y0 = idx[keep], x0[keep], y0[keep]
+
+    x = np.zeros_like(x0)
+    y = np.zeros_like(y0)
+
+    xs = x.copy()
+    ys = y.copy()
+    check = 1
+    if smooth:
+        zz_esc = np.zeros(px.size)
+
+    for i in range(max_cnt):
+        zz = x*x + y*y
+        live = zz <= 4
+        if not live.all():
+            # escaped pixels drop out of the work
+            cnt[idx[~live]] = i
+            if smooth:
+                zz_esc[idx[~live]] = zz[~live]
+            idx = idx[live]
+            x, y, x0, y0 = x[live], y[live], x0[live], y0[live]
+            if fast:
+                xs, ys = xs[live], ys[live]
+            if idx.size == 0:
+                break
+
+        xtmp = x*x - y*y + x0
+        y = 2*x*y + y0
+        x = xtmp
+
+        if fast:
+            # repeating orbits drop out too, count stays max_cnt
+            live = (x != xs) | (y != ys)
+            if not live.all():
+                FAST_STATS["period"] += int((~live).sum())
+                idx = idx[live]
+                x, y, x0, y0, xs, ys = x[live], y[live], x0[live], y0[live], xs[live], ys[live]
+                if idx.size == 0:
+                    break
+            if i + 1 == check:
+                xs = x.copy()
+                ys = y.copy()
+                check *= 2
+
+    if timing.ENABLED:
+        timing.add("iterate", s, time.perf_counter() - s)
+        if counted:
+            count_pixels(cnt, max_cnt)
+
+    if smooth:
+        return smooth_counts(cnt, zz_esc, 2, max_cnt).reshape(shape)
+    return cnt.reshape(shape)
+
+
+def julia_np(px, py, xc, yc, fx_min, fy_min, max_cnt=None, fast=False, smooth=False, precision=None, c=None,
+             counted=True):
+    """julia_px for a whole array of pixels at once, see mandelbrot_np"""
+
+    if max_cnt is None:
+        max_cnt = MAX_CNT
+    if c is None:
+        c = JULIA_C
+    dtype = float_type(xc, yc, precision)
+
+    zmax = JULIA_ZMAX
+
+    s = time.perf_counter()
+    px, py = np.broadcast_arrays(px, py)
+    shape = px.shape
+    cnt = np.full(px.size, max_cnt, dtype=np.int32)
+
+    z = np.empty(px.size, dtype=np.result_type(dtype, np.complex64))
+    z.real = (px / xc + fx_min).ravel()
+    z.imag = (py / yc + fy_min).ravel()
+    idx = np.arange(px.size)
+
+    zs = z.copy()
+    check = 1
+    if smooth:
+        zz_esc = np.zeros(px.size)
+
+    for i in range(max_cnt):
+        az = np.abs(z)
+        live = az <= zmax
+        if not live.all():
+            cnt[idx[~live]] = i
+            if smooth:
+                zz_esc[idx[~live]] = az[~live] ** 2
+            idx = idx[live]
+            z = z[live]
+            if fast:
+                zs = zs[live]
+            if idx.size == 0:
+                break
+
+        z = z*z + c
+
+        if fast:
+            live = z != zs
+            if not live.all():
+                FAST_STATS["period"] += int((~live).sum())
+                idx, z, zs = idx[live], z[live], zs[live]
+                if idx.size == 0:
+                    break
+            if i + 1 == check:
+                zs = z.copy()
+                check *= 2
+
+    if timing.ENABLED:
+        timing.add("iterate", s, time.perf_counter() - s)
+        if counted:
+            count_pixels(cnt, max_cnt)
+
+    if smooth:
+        return smooth_counts(cnt, zz_esc, zmax, max_cnt).reshape(shape)
+    return cnt.reshape(shape)
+
+
+def smooth_counts(cnt, zz, radius, max_cnt):
+    """
+fractional escape counts, no bands between one count and the next
+- n + 1 - log2(log|z| / log radius), |z|^2 = zz at the escape
+- points that never escaped stay max_cnt
+    """
+
+    mu = cnt.astype(np.float64)
+    esc = cnt < max_cnt
+    mu[esc] += 1 - np.log2(0.5 * np.log(zz[esc]) / math.log(radius))
+    return mu
+
+
+def count_pixels(cnt, max_cnt):
+    """timing counters for finished counts, iterations and escaped / bounded pixels"""
+
+    bounded = int((cnt >= max_cnt).sum())
+    timing.count("iterations", int(cnt.sum()))
+    timing.count("pixels escaped", cnt.size - bounded)
+    timing.count("pixels bounded", bounded)
+
+
+def mirror_axis(n, scale, f_min, tol=1e-6):
+    """
+pixel pairs with opposite coordinates along one axis, (pixels, partners)
+- p / scale + f_min == -(q / scale + f_min) to within tol of a pixel
+    """
+
+    p = np.arange(n)
+    v = p / scale + f_min
+    q = np.rint((-v - f_min) * scale)
+    ok = (q >= 0) & (q < n) & (np.abs(q / scale + f_min + v) * scale <= tol)
+    return p[ok], q[ok].astype(np.intp)
+
+
+def symmetry(fractal, xc, yc, fx_min, fy_min, w=None, h=None):
+    """
+part of the view that mirrors another part, None if there is none
+- w x h = frame size, default the screen (MAX_X x MAX_Y)
+- mandelbrot: count(conj(z)) = count(z), rows mirror about the real axis
+- julia: count(-z) = count(z), rows and columns mirror about the origin
+- returns (cols, src cols, rows, src rows), the mirrored pixels are a
+  rectangle below the axis, the rest of the view is computed as usual
+- partners are matched to a millionth of a pixel, so a few chaotic pixels
+  near the set can differ from computing them directly at high MAX_CNT
+    """
+
+    if w is None:
+        w, h = MAX_X, MAX_Y
+
+    rows, src_rows = mirror_axis(h, yc, fy_min)
+    below = rows > src_rows
+    rows, src_rows = rows[below], src_rows[below]
+
+    if fractal == "mandelbrot":
+        cols = src_cols = np.arange(w)
+    else:
+        cols, src_cols = mirror_axis(w, xc, fx_min)
+
+    if rows.size == 0 or cols.size == 0:
+        return None
+
+    n = rows.size * cols.size
+    print("symmetry: {:,} pixels mirrored, {:.1%} of the view".format(n, n / (w * h)))
+    timing.count("pixels mirrored", n)
+    return cols, src_cols, rows, src_rows
+
+
+def mirror_rect(sym):
+    """the mirrored pixels as a tile, (x0, y0, x1, y1)"""
+
+    cols, src_cols, rows, src_rows = sym
+    return cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+
+
+def mirror_fill(a, sym):
+    """copy the computed half into the mirrored rectangle of a"""
+
+    cols, src_cols, rows, src_rows = sym
+    with timing.stage("mirror"):
+        a[np.ix_(cols, rows)] = a[np.ix_(src_cols, src_rows)]
+
+
+def clip_tiles(tiles, rect):
+    """tiles with the rect (x0, y0, x1, y1) cut out, a tile may become up to 4"""
+
+    rx0, ry0, rx1, ry1 = rect
+    out = []
+    for t in tiles:
+        x0, y0, x1, y1 = t
+        if x1 <= rx0 or x0 >= rx1 or y1 <= ry0 or y0 >= ry1:
+            out.append(t)
+            continue
+        # above, below, then left and right of the rect
+        pieces = [(x0, y0, x1, ry0), (x0, ry1, x1, y1),
+                  (x0, max(y0, ry0), rx0, min(y1, ry1)), (rx1, max(y0, ry0), x1, min(y1, ry1))]
+        out += [(a, b, c, d) for a, b, c, d in pieces if c > a and d > b]
+    return out
+
+
+# array engine per fractal type
+fractal_np_map = {
+    "mandelbrot": mandelbrot_np,
+    "julia": julia_np,
+}
+
+
+def frame_np(xc, yc, fx_min, fy_min, max_cnt=None, fast=False, mirror=None, smooth=False,
+             fractal=None, w=None, h=None, c=None, precision=None):
+    """
+iteration counts for the whole screen, shape (MAX_X, MAX_Y)
+- mirror = use symmetry(), default SYMMETRY
+- smooth = fractional counts, see smooth_counts()
+- fractal, w x h, c and precision instead of FRACTAL, the screen size,
+  JULIA_C and PRECISION, eg. for sweep.py's images
+    """
+
+    if mirror is None:
+        mirror = SYMMETRY
+    if fractal is None:
+        fractal = FRACTAL
+    if w is None:
+        w, h = MAX_X, MAX_Y
+    kw = {"precision": precision}
+    if c is not None:
+        kw["c"] = c
+    sym = symmetry(fractal, xc, yc, fx_min, fy_min, w, h) if mirror else None
+
+    if sym is None:
+        x = np.arange(w)
+        y = np.arange(h)
+        return fractal_np_map[fractal](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, max_cnt, fast, smooth, **kw)
+
+    x0, y0, x1, y1 = mirror_rect(sym)
+    todo = np.ones((w, h), dtype=bool)
+    todo[x0:x1, y0:y1] = False
+    gx, gy = np.nonzero(todo)
+
+    a = np.zeros((w, h), dtype=np.float64 if smooth else np.int32)
+    a[gx, gy] = fractal_np_map[fractal](gx, gy, xc, yc, fx_min, fy_min, max_cnt, fast, smooth, **kw)
+    mirror_fill(a, sym)
+    return a
+
+
+def precision_check(fractal, xc, yc, fx_min, fy_min, max_cnt=None, a=None, step=AUTO_STEP):
+    """
+pixels of a float32 render that differ from float64, 0 for a float64 view
+- a = the rendered counts, compared in full against a float64 frame,
+  smooth counts differ when they are a palette key (1 / KEY_STEPS) apart
+- without a, every step'th pixel is computed both ways and the count is
+  an estimate for the whole frame
+    """
+
+    if float_type(xc, yc) is np.float64:
+        return 0
+
+    s = time.perf_counter()
+    smooth = a is not None and a.dtype.kind == "f"
+    if a is None:
+        x = np.arange(step // 2, MAX_X, step)
+        y = np.arange(step // 2, MAX_Y, step)
+        a = fractal_np_map[fractal](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, max_cnt, counted=False)
+    else:
+        x = np.arange(MAX_X)
+        y = np.arange(MAX_Y)
+    ref = fractal_np_map[fractal](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, max_cnt,
+                                  smooth=smooth, precision="float64", counted=False)
+
+    if smooth:
+        bad = int((np.abs(a - ref) >= 1 / palette.KEY_STEPS).sum())
+    else:
+        bad = int((a != ref).sum())
+    pixels = MAX_X * MAX_Y
+    bad = bad * pixels // ref.size
+
+    print("float32: {}{:,} of {:,} pixels differ from float64 ({:.2%}), {:.3f} sec".format(
+        "~" if ref.size < pixels else "", bad, pixels, bad / pixels, time.perf_counter() - s))
+    timing.count("pixels differing from float64", bad)
+    return bad
+
+
+def frame_loop(xc, yc, fx_min, fy_min, fast=False):
+    """iteration counts for the whole screen, one mandelbrot_px / julia_px call per pixel"""
+
+    fpx = mandelbrot_px if FRACTAL == "mandelbrot" else julia_px
+
+    a = np.zeros((MAX_X, MAX_Y), dtype=np.int32)
     for x in range(0, MAX_X):
         for y in range(0, MAX_Y):
-            if x % thread_cnt == thread:
-                cnt = calc_px(x, y, xc, yc)
-                if cnt > 2:
-                    q.put((x, y, cnt, thread))
+            a[x][y] = fpx(x, y, xc, yc, fx_min, fy_min, fast)
+    return a
+
+
+def default_view(fractal):
+    """starting fx_min, fx_max, fy_min, fy_max for a fractal"""
+
+    if fractal == "julia":
+        return -1.5, 1.5, -1.5, 1.5
+
+    # mandelbrot
+    return -2.00, 0.5, -1.2, 1.2
+
+
+def configure(fractal=None, max_cnt=None, max_x=None, max_y=None, julia_c=None):
+    """
+change the module settings (FRACTAL, MAX_CNT, MAX_X, MAX_Y, JULIA_C) for scripts
+- must be called before a RenderPool is started, producers keep their copy
     """
 
-    # break into sections
-    x0 = thread * MAX_X // thread_cnt
-    x1 = (thread+1) * MAX_X // thread_cnt
+    global FRACTAL, MAX_CNT, MAX_X, MAX_Y, JULIA_C
 
-    print("<p{}>  {} .. {}".format(thread, x0, x1))
-    for x in range(x0, x1):
-        for y in range(0, MAX_Y):
-            if FRACTAL == "mandelbrot":
-                cnt = mandelbrot_px(x, y, xc, yc, fx_min, fy_min)
-            else:
-                cnt = julia_px(x, y, xc, yc, fx_min, fy_min)
-                
-            if cnt > 2:
-                q.put((x, y, cnt, thread))
-    
+    if fractal is not None:
+        if fractal not in fractal_np_map:
+            raise ValueError("unknown fractal: {}".format(fractal))
+        FRACTAL = fractal
+    if max_cnt is not None:
+        MAX_CNT = max_cnt
+    if max_x is not None:
+        MAX_X = max_x
+    if max_y is not None:
+        MAX_Y = max_y
+    if julia_c is not None:
+        JULIA_C = complex(julia_c)
 
-    # thread done
-    #q.put((-1, -1, -1, thread))
 
-    print("<p{}> done, queue_size = {}".format(thread, q.qsize()), flush=True)
+def print_fast_stats():
+    """pixels each fast path shortcut skipped since the last call"""
 
+    print("fast path skipped: {:,} cardioid, {:,} bulb, {:,} periodic pixels".format(
+        FAST_STATS["cardioid"], FAST_STATS["bulb"], FAST_STATS["period"]))
+    for k in FAST_STATS:
+        FAST_STATS[k] = 0
 
-def consumer(q, bg, c):
-    """ read from queue (q) and process data """
-    
-    print("<c{}> started, queue size: {}".format(c, q.qsize()))
 
+def make_tiles(tile=TILE):
+    """cut the screen into tile x tile squares, (x0, y0, x1, y1)"""
 
-    done = False
+    return [(x0, y0, min(x0 + tile, MAX_X), min(y0 + tile, MAX_Y))
+            for x0 in range(0, MAX_X, tile)
+            for y0 in range(0, MAX_Y, tile)]
 
-    while not done:
-    
-        # blocking
-        item = q.get()
 
-        t = item[3] # color by thread ... 
-        cc = item[2]
-        if cc == -1:
+def order_tiles(tiles, fractal, xc, yc, fx_min, fy_min, max_cnt=None, fast=False, step=PREVIEW_STEP):
+    """
+most expensive tiles first, cost estimated from a coarse preview pass
+- every step'th pixel is computed, a tile costs the sum of its samples
+- big tiles go out first so the cheap ones fill in the gaps at the end
+    """
+
+    x = np.arange(0, MAX_X, step)
+    y = np.arange(0, MAX_Y, step)
+    preview = fractal_np_map[fractal](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, max_cnt, fast, counted=False)
+
+    def cost(t):
+        x0, y0, x1, y1 = t
+        return preview[-(-x0 // step):-(-x1 // step), -(-y0 // step):-(-y1 // step)].sum()
+
+    return sorted(tiles, key=cost, reverse=True)
+
+
+def producer(thread, shm_name, work_q, done_q, current):
+    """
+long lived render worker, lives as long as the RenderPool
+- takes (job, fractal, xc, yc, fx_min, fy_min, max_cnt, fast, precision, tile)
+  from the shared work queue until the None sentinel
+- counts go straight into the shared count buffer
+- every tile is answered with (job, thread, tile, start, compute sec, FAST_STATS)
+- tiles of a cancelled job (not current) are dropped without computing
+    """
+
+    print("<p{}> started".format(thread), flush=True)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buf = np.ndarray((MAX_X, MAX_Y), dtype=np.int32, buffer=shm.buf)
+
+    done_q.put(("ready", thread, None, 0.0, 0.0, None))
+
+    while True:
+        item = work_q.get()
+        if item is None:
+            break
+
+        s = time.perf_counter()
+        job, fractal, xc, yc, fx_min, fy_min, max_cnt, fast, precision, t = item
+        if job != current.value:
             continue
-        
-        # needed to exit properly ... close enough
-        if q.qsize() < 5:
-            done = True
 
+        x0, y0, x1, y1 = t
+        x = np.arange(x0, x1)
+        y = np.arange(y0, y1)
+        a = fractal_np_map[fractal](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, max_cnt, fast, precision=precision)
+        # cancelled while computing, the next job may own these pixels already
+        if job != current.value:
+            for k in FAST_STATS:
+                FAST_STATS[k] = 0
+            continue
+        buf[x0:x1, y0:y1] = a
 
+        done_q.put((job, thread, t, s, time.perf_counter() - s, dict(FAST_STATS)))
+        for k in FAST_STATS:
+            FAST_STATS[k] = 0
 
-        clr = int(cc / MAX_CNT * 255)
-        
-        px_color = (0,0,0)
+    del buf
+    shm.close()
 
-        # color per producer
-        if t % 3 == 0:
-            px_color = (clr, 0, 0) # red
-        elif t % 3 == 1:
-            px_color = (0, clr, 0) # green
-        else:
-            px_color = (0, 0, clr) # blue
+    print("<p{}> done".format(thread), flush=True)
 
-        # color per consumer
+
+class Cancelled(Exception):
+    """a render that was replaced by a newer one stops with this"""
+
+
+class RenderPool:
+    """
+producers started once and reused for every parallel render
+- a zoom only pays for the compute, not process startup or queue setup
+- the shared count buffer lives as long as the pool, it is unlinked by
+  close(), leaving a with block or at exit, whichever comes first
+- a producer that dies is an error instead of a render that never ends
+    """
+
+    def __init__(self, workers=8):
+        s = time.perf_counter()
+
+        self.workers = workers
+        self.job = 0
+        # job the producers should work on, tiles of any other job are skipped
+        self.current = Value("i", 0)
+        self.shm = shared_memory.SharedMemory(create=True, size=MAX_X * MAX_Y * 4)
+        atexit.register(self.unlink)
+        self.buf = np.ndarray((MAX_X, MAX_Y), dtype=np.int32, buffer=self.shm.buf)
+        self.work_q = Queue()
+        self.done_q = Queue()
+        # one render reads done_q at a time, a newer one waits for the one it replaced
+        self.lock = Lock()
+
+        self.p_list = []
+        try:
+            for i in range(workers):
+                p = Process(target=producer, args=(i, self.shm.name, self.work_q, self.done_q, self.current), daemon=True)
+                p.start()
+                self.p_list.append(p)
+
+            # wait until every producer can take work
+            for i in range(workers):
+                self.get(timeout=POOL_START_SEC)
+        except BaseException:
+            self.close()
+            raise
+
+        self.startup = time.perf_counter() - s
+        print("pool startup: {:.3f} sec, {} producers".format(self.startup, workers))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, timeout=None, job=None):
         """
-        if c % 3 == 0:
-            px_color = (clr, 0, clr)
-        elif c % 3 == 1:
-            px_color = (clr, clr, 0)
-        elif c % 3 == 2:
-            px_color = (0, clr, clr)
+next answer from the producers
+- RuntimeError if a producer died, TimeoutError after timeout sec
+- Cancelled once job isn't the current job any more
         """
-        if clr > 1:
-            bg.set_at((item[0], item[1]), px_color)
-        #pygame.gfxdraw.pixel(bg, item[0], item[1], px_color)
-        if q.qsize() % 100_000 == 0 or q.qsize() < 11:
-            print("<c{}> queue size: {}".format(c, q.qsize()))
-            screen.blit(bg, (0, 0))
-            pygame.display.flip()
 
-    
-    print("<c{}> done".format(c), flush=True)
+        s = time.perf_counter()
+        while True:
+            try:
+                return self.done_q.get(timeout=POOL_POLL)
+            except queue.Empty:
+                pass
+
+            if job is not None and self.current.value != job:
+                raise Cancelled("job {} was replaced".format(job))
+
+            for i, p in enumerate(self.p_list):
+                if not p.is_alive():
+                    raise RuntimeError("producer {} died, exit code {}".format(i, p.exitcode))
+            if timeout is not None and time.perf_counter() - s > timeout:
+                raise TimeoutError("no answer from the producers in {} sec".format(timeout))
+
+    def tiles(self, fractal, xc, yc, fx_min, fy_min, max_cnt=None, fast=False, stats=None, skip=None):
+        """
+render one frame, yields (n, thread, tile) as each tile lands in self.buf
+- stats = {thread: [compute sec, tiles]} is filled in if given
+- skip = (x0, y0, x1, y1) left out, eg. mirror_rect()
+- the producers' fast path skips are added to FAST_STATS
+- closing the generator early cancels the job, producers skip its tiles
+- a newer tiles() call (another thread) replaces it, this one raises
+  Cancelled within POOL_POLL sec
+        """
+
+        s = time.perf_counter()
+        self.job += 1
+        job = self.job
+        # the producers' own MAX_CNT and PRECISION are the ones they started with
+        if max_cnt is None:
+            max_cnt = MAX_CNT
+        precision = PRECISION
+
+        with timing.stage("preview"):
+            tiles = make_tiles()
+            if skip:
+                tiles = clip_tiles(tiles, skip)
+            tiles = order_tiles(tiles, fractal, xc, yc, fx_min, fy_min, max_cnt, fast)
+        # the preview is only an estimate, don't count its skips
+        for k in FAST_STATS:
+            FAST_STATS[k] = 0
+        self.current.value = job
+
+        if stats is None:
+            stats = {}
+        stats.update({i: [0.0, 0] for i in range(self.workers)})
+        with self.lock:
+            if self.current.value != job:
+                raise Cancelled("job {} was replaced".format(job))
+            with timing.stage("queue put"):
+                for t in tiles:
+                    self.work_q.put((job, fractal, xc, yc, fx_min, fy_min, max_cnt, fast, precision, t))
+            timing.count("queue items sent", len(tiles))
+            setup = time.perf_counter() - s
+
+            yield from self.collect(job, len(tiles), max_cnt, stats)
+
+        wall = time.perf_counter() - s
+
+        # anything not explained by the slowest producer's compute
+        overhead = wall - max(v[0] for v in stats.values())
+        print("job {}: {:.3f} sec, {} tiles, setup {:.3f} sec, overhead {:.3f} sec".format(
+            job, wall, len(tiles), setup, overhead))
+        print_worker_stats(stats, wall)
+
+    def collect(self, job, total, max_cnt, stats):
+        """the producers' answers for job, yields (n, thread, tile) until total tiles are in"""
+
+        n = 0
+        try:
+            while n < total:
+                with timing.stage("queue wait"):
+                    job_done, thread, t, start, busy, skipped = self.get(job=job)
+                timing.count("queue items received")
+                if job_done != job:
+                    continue
+
+                if timing.ENABLED:
+                    # producer compute, on its own row in the trace
+                    x0, y0, x1, y1 = t
+                    timing.add("compute", start, busy, "p{}".format(thread))
+                    count_pixels(self.buf[x0:x1, y0:y1], max_cnt)
+
+                for k in skipped:
+                    FAST_STATS[k] += skipped[k]
+
+                stats[thread][0] += busy
+                stats[thread][1] += 1
+                n += 1
+                yield n, thread, t
+        finally:
+            # a newer job may be current already
+            if self.current.value == job:
+                self.current.value = 0
+
+    def render(self, fractal, xc, yc, fx_min, fy_min, max_cnt=None, fast=False):
+        """render one frame and wait for it, returns (counts, stats)"""
+
+        sym = symmetry(fractal, xc, yc, fx_min, fy_min) if SYMMETRY else None
+
+        stats = {}
+        for n, thread, t in self.tiles(fractal, xc, yc, fx_min, fy_min, max_cnt, fast, stats,
+                                       mirror_rect(sym) if sym else None):
+            pass
+
+        a = self.buf.copy()
+        if sym:
+            mirror_fill(a, sym)
+        return a, stats
+
+    def close(self):
+        # a render still waiting on the producers stops (Cancelled)
+        self.current.value = 0
+        try:
+            for p in self.p_list:
+                self.work_q.put(None)
+            for p in self.p_list:
+                p.join(timeout=POOL_CLOSE_SEC)
+                # SIGKILL, the SIGTERM handler pygame sets up is inherited
+                # by the fork and would leave the producer running
+                if p.is_alive():
+                    p.kill()
+                    p.join()
+        finally:
+            self.unlink()
+
+    def unlink(self):
+        """free the shared count buffer, once"""
+
+        if self.shm is None:
+            return
+        self.buf = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # a view of buf is still around, the segment goes away with the process
+            pass
+        self.shm.unlink()
+        self.shm = None
+        atexit.unregister(self.unlink)
+
+
+def print_worker_stats(stats, wall):
+    """per worker busy / idle, and how well the cores stayed saturated"""
+
+    for t in sorted(stats):
+        busy, tiles = stats[t]
+        print("<p{}> {:4} tiles, busy {:.3f} sec, idle {:.3f} sec, {:.0%} busy".format(
+            t, tiles, busy, wall - busy, busy / wall))
+
+    total = sum(v[0] for v in stats.values())
+    print("cores saturated: {:.0%} ({:.3f} sec compute over {} producers in {:.3f} sec)".format(
+        total / (wall * len(stats)), total, len(stats), wall))
+
+
+
+def mariani_silver(fractal, xc, yc, fx_min, fy_min, max_cnt=None, fast=False):
+    """
+Mariani-Silver rectangle subdivision, returns (counts, pixels computed)
+- see mariani_levels()
+    """
+
+    for a, computed in mariani_levels(fractal, xc, yc, fx_min, fy_min, max_cnt, fast):
+        pass
+    return a, computed
+
+
+def mariani_levels(fractal, xc, yc, fx_min, fy_min, max_cnt=None, fast=False):
+    """
+Mariani-Silver rectangle subdivision, yields (counts, pixels computed) after
+every level, counts not known yet are -1
+- compute a rectangle's border, if the whole border has one count fill
+  the inside with it, otherwise cut the rectangle in half and repeat
+- rectangles MS_MIN or smaller are computed in full
+- all rectangles of one level go through the array engine in a single call
+    """
+
+    a = np.full((MAX_X, MAX_Y), -1, dtype=np.int32)
+    want = np.zeros((MAX_X, MAX_Y), dtype=bool)
+    computed = 0
+    rects = [(0, 0, MAX_X, MAX_Y)]
+
+    while rects:
+        big = []
+        for r in rects:
+            x0, y0, x1, y1 = r
+            if x1 - x0 <= MS_MIN or y1 - y0 <= MS_MIN:
+                # small, do every pixel
+                want[x0:x1, y0:y1] = True
+            else:
+                want[x0:x1, y0] = True
+                want[x0:x1, y1-1] = True
+                want[x0, y0:y1] = True
+                want[x1-1, y0:y1] = True
+                big.append(r)
+
+        # only pixels nobody has computed yet, neighbours share borders
+        want &= a < 0
+        px, py = np.nonzero(want)
+        a[px, py] = fractal_np_map[fractal](px, py, xc, yc, fx_min, fy_min, max_cnt, fast)
+        computed += px.size
+        want[px, py] = False
+
+        rects = []
+        for r in big:
+            x0, y0, x1, y1 = r
+            c = a[x0, y0]
+            if ((a[x0:x1, y0] == c).all() and (a[x0:x1, y1-1] == c).all()
+                    and (a[x0, y0:y1] == c).all() and (a[x1-1, y0:y1] == c).all()):
+                a[x0+1:x1-1, y0+1:y1-1] = c
+            elif x1 - x0 >= y1 - y0:
+                # split the long side, the middle column belongs to both halves
+                xm = (x0 + x1) // 2
+                rects += [(x0, y0, xm + 1, y1), (xm, y0, x1, y1)]
+            else:
+                ym = (y0 + y1) // 2
+                rects += [(x0, y0, x1, ym + 1), (x0, ym, x1, y1)]
+
+        yield a, computed
+
+
+def mariani_check(fractal, xc, yc, fx_min, fy_min, max_cnt=None, a=None):
+    """
+regression check, Mariani-Silver against the full brute force frame,
+returns the mismatched pixels (render.py -e mariani --check, test_fractal.py)
+- a = counts of a Mariani-Silver render already made, None = render one
+- a few can differ: detail thinner than a pixel that reaches into a
+  rectangle between two of its border pixels is filled over (1 pixel of
+  the default julia view)
+    """
+
+    if a is None:
+        s = time.perf_counter()
+        a, computed = mariani_silver(fractal, xc, yc, fx_min, fy_min, max_cnt)
+        print("mariani-silver {:.2f} sec, {:.1%} computed".format(time.perf_counter() - s, computed / a.size))
+
+    s = time.perf_counter()
+    x = np.arange(MAX_X)
+    y = np.arange(MAX_Y)
+    ref = fractal_np_map[fractal](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, max_cnt, counted=False)
+
+    bad = int((a != ref).sum())
+    print("brute force {:.2f} sec, {:,} mismatched pixels".format(time.perf_counter() - s, bad))
+    return bad
+
+
+def progressive(fractal, xc, yc, fx_min, fy_min, max_cnt=None, fast=False, smooth=False, band=100):
+    """
+coarse to fine render, yields (step, x0, counts) after every pass
+- every 4th pixel each way first (1/16 of the work), then every 2nd, then all
+- each pass only computes the pixels the earlier passes didn't have
+- counts are filled in blocks, step x step, so every pass is a full picture
+  from column x0 = 0, the last pass comes in bands of columns instead
+    """
+
+    a = np.full((MAX_X, MAX_Y), -1, dtype=np.float64 if smooth else np.int32)
+
+    for step in PROGRESSIVE_STEPS:
+        g = a[::step, ::step]
+        if step == 1:
+            for x0 in range(0, MAX_X, band):
+                b = a[x0:x0 + band]
+                gx, gy = np.nonzero(b < 0)
+                b[gx, gy] = fractal_np_map[fractal](gx + x0, gy, xc, yc, fx_min, fy_min, max_cnt, fast, smooth)
+                yield step, x0, b
+            continue
+
+        gx, gy = np.nonzero(g < 0)
+        g[gx, gy] = fractal_np_map[fractal](gx * step, gy * step, xc, yc, fx_min, fy_min, max_cnt, fast, smooth)
+        yield step, 0, np.repeat(np.repeat(g, step, axis=0), step, axis=1)[:MAX_X, :MAX_Y]
+
+
+class TileCache:
+    """
+LRU cache of count tiles, reused by zooming back out, reset and panning
+- key = (fractal, julia c, max_cnt, float type, xc, yc, tile column, tile row)
+- xc, yc = pixels per unit, the scale level
+- tile (i, j) covers pixels i*CACHE_TILE .. of a lattice anchored at 0,0 in
+  fractal space, so the same area at the same scale is always the same tile
+- oldest tiles are dropped once more than max_bytes are held
+- a cancelled render may still be finishing a batch while the next one
+  starts, get / put are locked
+    """
+
+    def __init__(self, max_bytes=CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.tiles = OrderedDict()
+        self.resident = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            a = self.tiles.get(key)
+            if a is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.tiles.move_to_end(key)
+            return a
+
+    def put(self, key, a):
+        with self.lock:
+            if key in self.tiles:
+                self.resident -= self.tiles.pop(key).nbytes
+
+            self.tiles[key] = a
+            self.resident += a.nbytes
+
+            while self.resident > self.max_bytes and len(self.tiles) > 1:
+                k, old = self.tiles.popitem(last=False)
+                self.resident -= old.nbytes
+
+    def info(self):
+        """hits, misses, tiles held and bytes held"""
+
+        return {"hits": self.hits, "misses": self.misses,
+                "tiles": len(self.tiles), "bytes": self.resident}
 
 
+# shared by every cached render in this process
+TILE_CACHE = TileCache()
+
+
+def cached_tiles(cache, fractal, xc, yc, fx_min, fy_min, max_cnt=None, fast=False, batch=32):
+    """
+the screen from cached tiles, yields (x, y, counts) per tile
+- the view is snapped to the nearest lattice pixel (less than a pixel)
+- missing tiles are computed batch at a time in one array engine call
+    """
+
+    if max_cnt is None:
+        max_cnt = MAX_CNT
+
+    T = CACHE_TILE
+    # global lattice pixel of screen pixel 0,0
+    gx0 = round(fx_min * xc)
+    gy0 = round(fy_min * yc)
+
+    tiles = [(i, j)
+             for i in range(gx0 // T, (gx0 + MAX_X - 1) // T + 1)
+             for j in range(gy0 // T, (gy0 + MAX_Y - 1) // T + 1)]
+
+    dtype = float_type(xc, yc)
+
+    def key(t):
+        return (fractal, JULIA_C, max_cnt, dtype, xc, yc) + t
+
+    def piece(t, a):
+        # part of the tile that is on the screen
+        x = t[0] * T - gx0
+        y = t[1] * T - gy0
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + T, MAX_X), min(y + T, MAX_Y)
+        return x0, y0, a[x0 - x:x1 - x, y0 - y:y1 - y]
+
+    missing = []
+    for t in tiles:
+        a = cache.get(key(t))
+        if a is None:
+            missing.append(t)
+        else:
+            yield piece(t, a)
+
+    r = np.arange(T)
+    for n in range(0, len(missing), batch):
+        todo = np.array(missing[n:n + batch])
+        # lattice pixel gx is at gx / xc in fractal space
+        px = (todo[:, 0, np.newaxis] * T + r)[:, :, np.newaxis]
+        py = (todo[:, 1, np.newaxis] * T + r)[:, np.newaxis, :]
+        counts = fractal_np_map[fractal](px, py, xc, yc, 0.0, 0.0, max_cnt, fast)
+
+        for t, a in zip(missing[n:n + batch], counts):
+            t = tuple(int(v) for v in t)
+            # a copy, a view would keep the whole batch alive behind the budget
+            a = a.copy()
+            cache.put(key(t), a)
+            yield piece(t, a)
+
+
+def frame_deep(view, x=None, y=None, max_cnt=None, orbit=None, stats=None):
+    """counts for columns x and rows y (default the whole screen) of a deepzoom.View"""
+
+    if max_cnt is None:
+        max_cnt = MAX_CNT
+    if x is None:
+        x = np.arange(MAX_X)
+    if y is None:
+        y = np.arange(MAX_Y)
+
+    s = time.perf_counter()
+    a = deepzoom.perturb(FRACTAL, x[:, np.newaxis], y, view, MAX_X, MAX_Y, max_cnt,
+                         JULIA_C, JULIA_ZMAX, orbit, stats)
+
+    if timing.ENABLED:
+        timing.add("iterate", s, time.perf_counter() - s)
+        count_pixels(a, max_cnt)
+
+    return a
+
+
+def auto_max_cnt(xc, yc, fx_min, fy_min, view=None, fixed=None):
+    """
+MAX_CNT for a view, from the zoom and a sparse sample pass
+- first guess AUTO_MIN + AUTO_PER_DECADE per 10x of zoom
+- samples (every AUTO_STEP pixels) still bounded at the cap are run again at
+  twice the cap, until fewer than AUTO_CHANGE of them escape in the extra
+  iterations (and some have escaped), more would only change pixels nobody
+  sees
+- the cap is then lowered to just above the escaped samples, again leaving
+  out at most AUTO_CHANGE of them
+- view = deepzoom.View, sampled with the perturbation engine instead
+- the cap and the iterations per pixel it saves are printed, fixed = the
+  MAX_CNT it replaces, for comparison
+    """
+
+    s = time.perf_counter()
+
+    x = np.arange(AUTO_STEP // 2, MAX_X, AUTO_STEP)
+    y = np.arange(AUTO_STEP // 2, MAX_Y, AUTO_STEP)
+    gx, gy = (v.ravel() for v in np.meshgrid(x, y, indexing="ij"))
+
+    fx0, fx1 = default_view(FRACTAL)[:2]
+    if view is None:
+        zoom = (fx1 - fx0) / MAX_X * xc
+
+        def sample(px, py, max_cnt):
+            return fractal_np_map[FRACTAL](px, py, xc, yc, fx_min, fy_min, max_cnt, counted=False)
+    else:
+        zoom = (fx1 - fx0) / MAX_X / view.dx
+
+        def sample(px, py, max_cnt):
+            return deepzoom.perturb(FRACTAL, px, py, view, MAX_X, MAX_Y, max_cnt, JULIA_C, JULIA_ZMAX)
+
+    guess = min(int(AUTO_MIN + AUTO_PER_DECADE * max(0.0, math.log10(zoom))), AUTO_MAX)
+    cap = guess
+    cnt = sample(gx, gy, cap)
+
+    # raise the cap while it still changes pixels, and while nothing has
+    # escaped at all (deep views, the cap hasn't reached the view's depth)
+    changed = 0.0
+    while cap < AUTO_MAX:
+        live = np.flatnonzero(cnt >= cap)
+        if live.size == 0:
+            changed = 0.0
+            break
+        top = min(2 * cap, AUTO_MAX)
+        cnt[live] = sample(gx[live], gy[live], top)
+        changed = (cnt[live] < top).sum() / cnt.size
+        cap = top
+        if changed < AUTO_CHANGE and (cnt < cap).any():
+            break
+
+    # lower it to the escaped counts, with few or none escaped not below
+    # the first guess or the counts that did escape
+    top = cap
+    escaped = np.sort(cnt[cnt < top])
+    allowed = int(AUTO_CHANGE * cnt.size)
+    if escaped.size > allowed:
+        cap = max(AUTO_MIN, int(escaped[escaped.size - allowed - 1]) + 1)
+    elif escaped.size:
+        cap = max(guess, int(escaped[-1]) + 1)
+    else:
+        cap = guess
+
+    def work(c):
+        # iterations per pixel at cap c, bounded samples cost the whole cap
+        return np.where(cnt >= top, c, np.minimum(cnt, c)).mean()
+
+    sec = time.perf_counter() - s
+    timing.add("auto cap", s, sec)
+    timing.count("auto samples", int(cnt.size))
+
+    print("auto MAX_CNT: {} at zoom {:.3g}x, {:.2%} of {:,} samples still changing at {}, {:.3f} sec".format(
+        cap, zoom, changed, cnt.size, top, sec))
+    msg = "auto MAX_CNT: ~{:.0f} iterations per pixel, {:.0%} saved vs {}".format(
+        work(cap), 1 - work(cap) / work(top), top)
+    if fixed:
+        msg += ", {:+.0%} vs MAX_CNT {}".format(work(cap) / work(fixed) - 1, fixed)
+    print(msg)
+
+    return cap
+
+
+def edges(a, threshold=None):
+    """pixels whose count differs from a neighbour's (left, right, up, down) by more than threshold (AA_THRESHOLD)"""
+
+    if threshold is None:
+        threshold = AA_THRESHOLD
+    a = a.astype(np.float64)
+    e = np.zeros(a.shape, dtype=bool)
+    d = np.abs(np.diff(a, axis=0)) > threshold
+    e[1:] |= d
+    e[:-1] |= d
+    d = np.abs(np.diff(a, axis=1)) > threshold
+    e[:, 1:] |= d
+    e[:, :-1] |= d
+    return e
+
+
+def supersample(a, xc, yc, fx_min, fy_min, n=None, threshold=None, view=None,
+                max_cnt=None, fast=False, smooth=False):
+    """
+extra samples for the edges() of a frame of counts a, nothing else
+- every edge pixel gets n x n (AA_SAMPLES) samples over its footprint, centered
+  on the pixel's own sample point, so the cost follows the edge density
+- view = deepzoom.View, sampled with the perturbation engine instead
+- returns (x, y, counts (pixels, n * n), weights (n * n)), the weights
+  are AA_FILTER ("box" or "gauss") and add up to 1, see antialias()
+    """
+
+    if n is None:
+        n = AA_SAMPLES
+
+    s = time.perf_counter()
+    gx, gy = np.nonzero(edges(a, threshold))
+
+    o = (np.arange(n) + 0.5) / n - 0.5
+    ox, oy = (v.ravel() for v in np.meshgrid(o, o, indexing="ij"))
+    px = gx[:, np.newaxis] + ox
+    py = gy[:, np.newaxis] + oy
+
+    if view is None:
+        counts = fractal_np_map[FRACTAL](px, py, xc, yc, fx_min, fy_min, max_cnt, fast, smooth, counted=False)
+    else:
+        counts = deepzoom.perturb(FRACTAL, px, py, view, MAX_X, MAX_Y, max_cnt or MAX_CNT, JULIA_C, JULIA_ZMAX)
+
+    if AA_FILTER == "gauss":
+        w = np.exp(-(ox*ox + oy*oy) / (2 * AA_SIGMA * AA_SIGMA))
+    else:
+        w = np.ones(ox.size)
+
+    t = time.perf_counter() - s
+    timing.add("supersample", s, t)
+    timing.count("pixels supersampled", int(gx.size))
+    print("supersample: {:,} edge pixels ({:.1%}) x {} samples, {:.2f} samples per pixel instead of {}, {:.2f} sec".format(
+        gx.size, gx.size / a.size, n * n, 1 + counts.size / a.size, n * n, t))
+
+    return gx, gy, counts, w / w.sum()
+
+
+def antialias(rgb, aa, color):
+    """
+average the supersample() samples into an rgb frame (in place)
+- color = counts to rgb for the samples, with the frame's palette
+    """
+
+    x, y, counts, w = aa
+    if x.size:
+        c = color(counts).astype(np.float64)
+        rgb[x, y] = np.rint(np.einsum("pkc,k->pc", c, w)).astype(np.uint8)
+    return rgb
+
+
+def render_loop(xc, yc, fx_min, fy_min, fast=False, pool=None):
+    """the original one pixel at a time loop, yields every 10 columns"""
+
+    print("loop start")
+    s = time.perf_counter()
+    fpx = mandelbrot_px if FRACTAL == "mandelbrot" else julia_px
+
+    for x0 in range(0, MAX_X, 10):
+        a = np.zeros((min(10, MAX_X - x0), MAX_Y), dtype=np.int32)
+        with timing.stage("iterate"):
+            for x in range(x0, x0 + a.shape[0]):
+                for y in range(0, MAX_Y):
+                    a[x - x0][y] = fpx(x, y, xc, yc, fx_min, fy_min, fast)
+
+        yield x0, 0, a
+
+    print("single thread loop done: {:.2f} sec, {:,} pixels".format(time.perf_counter() - s, MAX_X * MAX_Y))
+
+
+def render_numpy(xc, yc, fx_min, fy_min, fast=False, pool=None):
+    """array engine, in bands of 100 columns so a render can be cancelled"""
+
+    print("numpy start")
+    s = time.perf_counter()
+    y = np.arange(MAX_Y)
+
+    sym = symmetry(FRACTAL, xc, yc, fx_min, fy_min) if SYMMETRY else None
+    if sym:
+        # the mirrored rectangle is skipped here and copied at the end
+        a = np.zeros((MAX_X, MAX_Y), dtype=np.float64 if SMOOTH else np.int32)
+        mx0, my0, mx1, my1 = mirror_rect(sym)
+        todo = np.ones((MAX_X, MAX_Y), dtype=bool)
+        todo[mx0:mx1, my0:my1] = False
+
+    for x0 in range(0, MAX_X, 100):
+        x = np.arange(x0, min(x0 + 100, MAX_X))
+        if sym:
+            band = a[x0:x0 + x.size]
+            gx, gy = np.nonzero(todo[x0:x0 + x.size])
+            band[gx, gy] = fractal_np_map[FRACTAL](gx + x0, gy, xc, yc, fx_min, fy_min, fast=fast, smooth=SMOOTH)
+        else:
+            band = fractal_np_map[FRACTAL](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, fast=fast, smooth=SMOOTH)
+        yield x0, 0, band
+
+    if sym:
+        mirror_fill(a, sym)
+        yield mx0, my0, a[mx0:mx1, my0:my1]
+
+    print("numpy done: {:.2f} sec, {:,} pixels".format(time.perf_counter() - s, MAX_X * MAX_Y))
+
+
+def render_pool(xc, yc, fx_min, fy_min, fast=False, pool=None):
+    """multiprocessing, every tile colored by the producer that made it"""
+
+    s = time.perf_counter()
+    sym = symmetry(FRACTAL, xc, yc, fx_min, fy_min) if SYMMETRY else None
+    skip = mirror_rect(sym) if sym else None
+
+    for n, thread, t in pool.tiles(FRACTAL, xc, yc, fx_min, fy_min, fast=fast, skip=skip):
+        x0, y0, x1, y1 = t
+        yield x0, y0, pool.buf[x0:x1, y0:y1].copy(), thread
+
+    if sym:
+        # mirrored part in the plain palette, it wasn't made by any producer
+        mirror_fill(pool.buf, sym)
+        x0, y0, x1, y1 = skip
+        yield x0, y0, pool.buf[x0:x1, y0:y1].copy()
+
+    print("mp done: {:.2f} sec, {:,} pixels".format(time.perf_counter() - s, MAX_X * MAX_Y))
+
+
+def render_mariani(xc, yc, fx_min, fy_min, fast=False, pool=None):
+    """skip over areas with the same count"""
+
+    s = time.perf_counter()
+
+    # the frame so far after every subdivision level, pixels not known yet stay black
+    for a, computed in mariani_levels(FRACTAL, xc, yc, fx_min, fy_min, fast=fast):
+        yield 0, 0, a.copy()
+
+    print("mariani-silver done: {:.2f} sec, {:,} pixels, {:.1%} computed".format(
+        time.perf_counter() - s, MAX_X * MAX_Y, computed / (MAX_X * MAX_Y)))
+
+
+def render_progressive(xc, yc, fx_min, fy_min, fast=False, pool=None):
+    """quick preview first, then sharpen"""
+
+    s = time.perf_counter()
+
+    for step, x0, a in progressive(FRACTAL, xc, yc, fx_min, fy_min, fast=fast, smooth=SMOOTH):
+        yield x0, 0, a
+        if x0 + a.shape[0] == MAX_X:
+            print("1/{} pass: {:.3f} sec".format(step * step, time.perf_counter() - s))
+
+
+def render_cached(xc, yc, fx_min, fy_min, fast=False, pool=None):
+    """array engine through the tile cache, areas seen before are free"""
+
+    s = time.perf_counter()
+    info = TILE_CACHE.info()
+
+    for x, y, a in cached_tiles(TILE_CACHE, FRACTAL, xc, yc, fx_min, fy_min, fast=fast):
+        yield x, y, a
+
+    now = TILE_CACHE.info()
+    print("cached done: {:.2f} sec, {} hits, {} misses, {} tiles / {:.1f} MB held".format(
+        time.perf_counter() - s, now["hits"] - info["hits"], now["misses"] - info["misses"],
+        now["tiles"], now["bytes"] / 1024 / 1024))
+
+
+def render_deep(view):
+    """perturbation engine, in bands of 100 columns, one reference orbit for all"""
+
+    print("deep start: {}".format(view))
+    s = time.perf_counter()
+
+    with timing.stage("reference"):
+        orbit = deepzoom.reference(FRACTAL, view, MAX_CNT, JULIA_C, JULIA_ZMAX)
+    print("reference orbit: {} iterations at {} digits, {:.3f} sec".format(
+        orbit.size, view.digits(), time.perf_counter() - s))
+
+    stats = {}
+    y = np.arange(MAX_Y)
+    for x0 in range(0, MAX_X, 100):
+        x = np.arange(x0, min(x0 + 100, MAX_X))
+        yield x0, 0, frame_deep(view, x, y, orbit=orbit, stats=stats)
+
+    print("deep done: {:.2f} sec, {:,} pixels, {:,} glitch rebases".format(
+        time.perf_counter() - s, MAX_X * MAX_Y, stats.get("rebases", 0)))
+
+
+def render_auto(pieces, xc, yc, fx_min, fy_min, view=None, fixed=None):
+    """
+auto MAX_CNT as the first step of a render, in the job's thread
+- yields ("max_cnt", cap) first, RenderJob makes it MAX_CNT before the
+  render's own pieces are computed, then the pieces of the render
+    """
+
+    yield "max_cnt", auto_max_cnt(xc, yc, fx_min, fy_min, view, fixed)
+    yield from pieces
+
+
+# render mode to piece generator
+render_map = {
+    "loop": render_loop,
+    "numpy": render_numpy,
+    "mp": render_pool,
+    "mariani": render_mariani,
+    "progressive": render_progressive,
+    "cached": render_cached,
+}
+
+
+class RenderJob:
+    """
+run a render generator in a background thread
+- pieces (x, y, counts) or (x, y, counts, producer) are queued for the event
+  loop to draw, ("max_cnt", cap) sets MAX_CNT, see render_auto()
+- cancel() stops it at the next piece without waiting for it, the thread
+  ends by itself, a None piece means it finished
+    """
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.q = queue.Queue()
+        self.cancelled = Event()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        global MAX_CNT
+
+        try:
+            for piece in self.pieces:
+                if self.cancelled.is_set():
+                    return
+                if isinstance(piece[0], str):
+                    # render_auto(), the cap holds before the generator goes on
+                    MAX_CNT = piece[1]
+                self.q.put(piece)
+            self.q.put(None)
+        except Cancelled:
+            pass
+        finally:
+            self.pieces.close()
+
+    def cancel(self):
+        self.cancelled.set()
+        # whatever it made already isn't drawn, the event loop doesn't wait
+        self.q = queue.Queue()
+
+
+class Canvas:
+    """
+the screen's counts and the palette they are drawn with
+- pieces of counts are kept as palette keys, a draw is one numpy index
+  into a key -> pixel table (already in the surface's pixel format)
+  written straight into the background's pixels
+- the table is O(MAX_CNT) to make, a cycling step, a new palette or a new
+  histogram only remake it, nothing is rendered again
+- the count histogram is kept up to date piece by piece, with equalize on
+  the colors follow it every EQUALIZE_SEC while a render comes in
+- mp tiles remember their producer and keep only its color channel
+- max_cnt is MAX_CNT as of the last clear(), the auto cap changes it
+    """
+
+    def __init__(self, bg, name=PALETTE):
+        self.bg = bg
+        self.max_cnt = MAX_CNT
+        self.keys = np.full((MAX_X, MAX_Y), MAX_CNT * palette.KEY_STEPS + 1, dtype=np.uint32)
+        self.hist = np.zeros(MAX_CNT * palette.KEY_STEPS, dtype=np.int64)
+        self.band = np.zeros((MAX_X, MAX_Y), dtype=np.uint8) # 0 = plain, 1..3 = producer color
+        self.offset = 0
+        self.equalize = EQUALIZE
+        self.pending = False # pieces drawn since the last equalized refresh
+        self.refreshed = 0.0
+        self.set_palette(name)
+
+    def set_palette(self, name):
+        self.name = name
+        self.lut = palette.make_lut(name)
+        self.inside = palette.INSIDE[name]
+        self.map_table()
+
+    def map_table(self):
+        """key to surface pixel table, plain and one per producer color band"""
+
+        table = palette.table(self.lut, self.inside)
+        bands = [table] + [table * np.eye(3, dtype=np.uint8)[k] for k in range(3)]
+        mapped = pygame.surfarray.map_array(self.bg, np.stack(bands))
+
+        pos = palette.key_positions(self.max_cnt, len(self.lut), self.offset, self.inside is not None,
+                                    self.hist if self.equalize else None)
+        self.mapped = mapped[:, pos]
+
+    def clear(self):
+        if self.max_cnt != MAX_CNT:
+            self.max_cnt = MAX_CNT
+            self.hist = np.zeros(MAX_CNT * palette.KEY_STEPS, dtype=np.int64)
+            self.map_table()
+        self.keys.fill(self.max_cnt * palette.KEY_STEPS + 1)
+        self.hist.fill(0)
+        self.band.fill(0)
+        self.bg.fill((0, 0, 0))
+
+    def draw(self, x, y, a, thread=-1):
+        """keep and draw a piece of counts"""
+
+        x1 = x + a.shape[0]
+        y1 = y + a.shape[1]
+        with timing.stage("color"):
+            keys = palette.count_keys(a, self.max_cnt)
+            # the piece may cover pixels drawn before (progressive passes)
+            old = self.keys[x:x1, y:y1]
+            self.hist -= palette.key_histogram(old, self.max_cnt)
+            self.hist += palette.key_histogram(keys, self.max_cnt)
+            old[...] = keys
+            self.band[x:x1, y:y1] = 0 if thread < 0 else 1 + thread % 3
+
+        if self.equalize:
+            self.pending = True
+        else:
+            self.blit(x, y, x1, y1)
+
+    def blit(self, x0, y0, x1, y1):
+        with timing.stage("color"):
+            pixels = self.mapped[self.band[x0:x1, y0:y1], self.keys[x0:x1, y0:y1]]
+        with timing.stage("blit"):
+            px = pygame.surfarray.pixels2d(self.bg)
+            px[x0:x1, y0:y1] = pixels
+            del px
+        timing.count("blits")
+
+    def redraw(self):
+        """recolor the whole screen"""
+
+        self.blit(0, 0, MAX_X, MAX_Y)
+
+    def refresh(self):
+        """remake the table (new histogram, offset or equalize) and recolor"""
+
+        self.map_table()
+        self.redraw()
+        self.pending = False
+        self.refreshed = time.perf_counter()
+
+    def cycle(self, step=None):
+        """rotate the palette by step lut entries, default CYCLE_STEP"""
+
+        if step is None:
+            step = CYCLE_STEP
+        self.offset = (self.offset + step) % len(self.lut)
+        self.refresh()
+
+
+def consumer(job, canvas):
+    """draw every piece the job has finished so far, returns False once the job is done"""
+
+    running = True
+    while True:
+        try:
+            piece = job.q.get_nowait()
+        except queue.Empty:
+            break
+
+        if piece is None:
+            running = False
+            break
+
+        if isinstance(piece[0], str):
+            # the job picked its MAX_CNT, nothing is drawn yet
+            canvas.clear()
+            continue
+
+        canvas.draw(*piece)
+
+    if canvas.pending and (not running or time.perf_counter() - canvas.refreshed > EQUALIZE_SEC):
+        # colors follow the histogram so far
+        canvas.refresh()
+
+    return running
+
 
 def init_screen():
     
@@ -228,7 +1722,9 @@ def init_screen():
 def fractal(screen):
     """make a fractal"""
 
-    clock_tick = 2
+    global SYMMETRY, SMOOTH, MAX_CNT, PRECISION
+
+    clock_tick = 30 # fast enough to start a preview right after a selection
     clock = pygame.time.Clock()
 
     bg = pygame.Surface(screen.get_size())
@@ -237,15 +1733,15 @@ def fractal(screen):
     background_color = (0,0,0)
     bg.fill(background_color)
 
-    # mandelbrot fractal coordinates
-    fx_min, fx_max = -2.00, 0.5
-    fy_min, fy_max = -1.2, 1.2
+    # counts on screen and their palette
+    canvas = Canvas(bg)
+    cycle_flag = False
 
-    # julia
-    if FRACTAL == "julia":
-        fx_min, fx_max = -1.5, 1.5
-        fy_min, fy_max = -1.5, 1.5
-        
+    # fractal coordinates
+    fx_min, fx_max, fy_min, fy_max = default_view(FRACTAL)
+
+    # same view at high precision for the deep zoom mode
+    dview = deepzoom.View.from_box(fx_min, fx_max, fy_min, fy_max, MAX_X, MAX_Y)
 
     xc = MAX_X / (fx_max - fx_min)
     yc = MAX_Y / (fy_max - fy_min)
@@ -254,15 +1750,13 @@ def fractal(screen):
 
     done = False
     loop_cnt = 0
-    pal_cnt = 0
 
     mp_max = 8
-    thread_max = 2
 
     redraw_flag = True # False # True # draw fractal
-    mflag = False # use multiprocessing
-    bg0 = None # background object
-    q = Queue()
+    mode = "loop" # key in render_map: loop, numpy, mp, mariani, progressive, cached or deep
+    job = None # render running in the background
+    frame_ms = [] # event loop frame times while a job runs
 
     # selection
     draw_sq_flag = False
@@ -275,13 +1769,18 @@ def fractal(screen):
 
     print("CPU cnt: {}".format(cpu_count()))
 
-    # vectorize fractal function
+    # producers live for the whole session
+    pool = RenderPool(mp_max)
+
+    # numpy array engine
     np_flag = False
-    fv = None
-    if FRACTAL == "mandelbrot":
-        fv = np.vectorize(mandelbrot_px)
-    elif FRACTAL == "julia":
-        fv = np.vectorize(julia_px)
+
+    # cardioid / bulb / periodicity shortcuts, same picture
+    fast_flag = False
+
+    # MAX_CNT picked per render from the zoom and a sample pass
+    auto_flag = False
+    fixed_cnt = MAX_CNT
 
     
 
@@ -289,139 +1788,71 @@ def fractal(screen):
 
         loop_cnt += 1
 
-        if draw_sq_flag:
-            
-            sx0 = min(s0[0], s1[0])
-            sy0 = min(s0[1], s1[1])
-
-            sq_width = abs(s0[0] - s1[0])
-            sq_height = abs(s0[1] - s1[1])
-            print("-- {} x {}".format(sq_width, sq_height))
-
-            # set bg to copy
-            bg.fill(background_color)
-            if bg0:
-                bg.blit(bg0, (0,0))
-            
-                
-            pygame.draw.rect(bg, sq_color, [sx0, sy0, sq_width, sq_height], 2)
-            
-            # transparentcy not working, wanted a semi-transparent selection square
-            #pygame.draw.rect(bg, sq_color, [sx0, sy0, sq_width, sq_height])
-            
-            screen.blit(bg, (0,0))
-            pygame.display.flip()
-
-
-
         if redraw_flag:
 
-            bg.fill(background_color)
+            # a new render replaces whatever is still running
+            if job:
+                job.cancel()
+                print("render cancelled")
 
+            timing.reset()
+            canvas.clear()
 
-            if mflag:
-                # use multiprocessing & threads
-                s = time.perf_counter()
+            if mode == "deep":
+                pieces = render_deep(dview)
+            else:
+                pieces = render_map[mode](xc, yc, fx_min, fy_min, fast_flag, pool)
+            if auto_flag:
+                # the sample pass runs in the job, the window stays responsive
+                pieces = render_auto(pieces, xc, yc, fx_min, fy_min, dview if mode == "deep" else None, fixed_cnt)
+            job = RenderJob(pieces)
+            frame_ms = []
+            
+            redraw_flag = False
 
-                p_list = []
-                for i in range(mp_max):
-                    # producer
-                    p = Process(target=producer, args=(i, mp_max, xc, yc, fx_min, fy_min, q))
-                    p.start()
-                    p_list.append(p)
 
-                # must be before join of multiprocess threads
+        if job:
+            # draw whatever the render has finished, keep the window responsive
+            if not consumer(job, canvas):
+                job = None
+                if fast_flag:
+                    print_fast_stats()
+                if mode not in ("loop", "deep"):
+                    precision_check(FRACTAL, xc, yc, fx_min, fy_min)
+                if frame_ms:
+                    print("event loop: {} frames, {:.0f} ms average, {} ms slowest".format(
+                        len(frame_ms), sum(frame_ms) / len(frame_ms), max(frame_ms)))
+                if timing.ENABLED:
+                    timing.summary(mode)
+                    timing.save_trace(TRACE_FILE)
 
-                t_list = []
-                for i in range(thread_max):
-                    t = Thread(target=consumer, args=(q, bg, i))
-                    t_list.append(t)
-                    t.start()
 
-                for p in p_list:
-                    p.join()
-                
-                print("producers done")
+        if cycle_flag:
+            canvas.cycle()
 
-                for t in t_list:
-                    t.join()
-                
-                print("consumers done")
-                print("mp & threads done: {:.2f} sec, {:,} pixels".format(time.perf_counter() - s, MAX_X * MAX_Y))
+        screen.blit(bg, (0, 0))
 
+        if draw_sq_flag:
             
-            else:            
-                # just normal processing
-
-                if np_flag:
-                    print("numpy start")
-                    s = time.perf_counter()
-
-                    x = np.linspace(1, MAX_X, MAX_X)
-                    y = np.linspace(1, MAX_Y, MAX_Y)
-                    a = fv(x[:, np.newaxis], y, xc, yc, fx_min, fy_min)
-                    surf = pygame.surfarray.make_surface(a)
-                    bg.blit(surf, (0,0))
-
-                    print("numpy done: {:.2f} sec, {:,} pixels".format(time.perf_counter() - s, MAX_X * MAX_Y))
-
-
-                else:
-                    print("loop start")
-                    s = time.perf_counter()
-                    a = np.zeros((MAX_X, MAX_Y))            
-                    for x in range(0, MAX_X):
-                        for y in range(0, MAX_Y):
-                            c = 32
-                            if FRACTAL == "mandelbrot":
-                                c = mandelbrot_px(x, y, xc, yc, fx_min, fy_min)
-                            elif FRACTAL == "julia":
-                                c = julia_px(x, y, xc, yc, fx_min, fy_min)
-
-                            shade = c / MAX_CNT
-                            #shade = 1 - math.sqrt(c / MAX_CNT)
-                            #shade = math.sqrt(c / MAX_CNT)
-                            cc = int(shade * 255)
-                            a[x][y] = cc
-                            """
-                            if cc > 1:
-                                #px_color = (cc, 255-cc, cc) # green bg, pink
-                                px_color = (cc, cc, cc) # black & white
-                                #px_color = (255-cc, 255-cc, 255-cc) # white & black
-
-                                # set_at = 15.63 sec
-                                #bg.set_at((x, y), px_color)
-                                pygame.gfxdraw.pixel(bg, x, y, px_color)                    
-                            """
-                    
-                        # refresh every stripe
-                        
-                        if x % 100 == 0:
-                            #screen.blit(bg, (0, 0))
-                            #pygame.display.flip()
-                            surf = pygame.surfarray.make_surface(a)        
-                            bg.blit(surf, (0,0))
-                            pygame.display.flip()
-
-                    surf = pygame.surfarray.make_surface(a)
-                    bg.blit(surf, (0,0))
-            
-
-                    #screen.blit(bg, (0, 0))
-                    #pygame.display.flip()                
+            sx0 = min(s0[0], s1[0])
+            sy0 = min(s0[1], s1[1])
 
-                    print("single thread loop done: {:.2f} sec, {:,} pixels".format(time.perf_counter() - s, MAX_X * MAX_Y))
+            sq_width = abs(s0[0] - s1[0])
+            sq_height = abs(s0[1] - s1[1])
 
+            pygame.draw.rect(screen, sq_color, [sx0, sy0, sq_width, sq_height], 2)
+            
+            # transparentcy not working, wanted a semi-transparent selection square
+            #pygame.draw.rect(bg, sq_color, [sx0, sy0, sq_width, sq_height])
 
-            screen.blit(bg, (0, 0))
+        with timing.stage("flip"):
             pygame.display.flip()
-            bg0 = bg.copy()
-            
-            redraw_flag = False
 
 
 
-        clock.tick(clock_tick) 
+        ms = clock.tick(clock_tick) 
+        if job:
+            frame_ms.append(ms)
 
         for event in pygame.event.get():
             mm = pygame.mouse.get_pos()
@@ -432,6 +1863,11 @@ def fractal(screen):
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
+                    # new selection, stop the render that's running
+                    if job:
+                        job.cancel()
+                        job = None
+                        print("render cancelled")
                     s0 = mm
                     s1 = mm
                     select_flag = True
@@ -466,10 +1902,20 @@ def fractal(screen):
                         fy_max = fy_max_new
 
                     print("fractal area: {:.6f},{:.6f} to {:.6f},{:.6f}".format(fx_min, fy_min, fx_max, fy_max))
+
+                    dview = dview.zoom(sx0, sy0, sx1, sy1, MAX_X, MAX_Y)
+                    if mode == "deep":
+                        print("deep view: {}".format(dview))
+                    elif dview.dx < abs(float(dview.cx)) * 1e-13:
+                        print("past float precision, use \"d\" for deep zoom")
                     
                     xc = MAX_X / (fx_max - fx_min)
                     yc = MAX_Y / (fy_max - fy_min)
 
+                    # progressive mode draws the new area right away
+                    if mode == "progressive":
+                        redraw_flag = True
+
 
 
 
@@ -478,35 +1924,88 @@ def fractal(screen):
             elif event.type == KEYDOWN:
 
                 if event.key == K_s:
-                    mflag = False
+                    mode = "numpy" if np_flag else "loop"
                     redraw_flag = True
                 if event.key == K_n:
                     # numpy
-                    mflag = False
-                    redraw_flag = True                    
                     np_flag = not np_flag
+                    mode = "numpy" if np_flag else "loop"
+                    redraw_flag = True                    
                 if event.key == K_p:
-                    mflag = True
+                    mode = "mp"
+                    redraw_flag = True
+                if event.key == K_m:
+                    mode = "mariani"
+                    redraw_flag = True
+                if event.key == K_g:
+                    mode = "progressive"
+                    redraw_flag = True
+                if event.key == K_c:
+                    mode = "cached"
                     redraw_flag = True
+                if event.key == K_d:
+                    mode = "deep"
+                    redraw_flag = True
+                if event.key == K_a:
+                    auto_flag = not auto_flag
+                    if not auto_flag:
+                        MAX_CNT = fixed_cnt
+                    print("auto MAX_CNT: {}, MAX_CNT {}".format(auto_flag, MAX_CNT))
+                if event.key == K_b:
+                    PRECISION = PRECISIONS[(PRECISIONS.index(PRECISION) + 1) % len(PRECISIONS)]
+                    print("precision: {}, this view {}".format(PRECISION, float_type(xc, yc).__name__))
+                if event.key == K_f:
+                    fast_flag = not fast_flag
+                    print("fast path: {}".format(fast_flag))
+                if event.key == K_l:
+                    # next palette, same counts
+                    names = list(palette.PALETTES)
+                    canvas.set_palette(names[(names.index(canvas.name) + 1) % len(names)])
+                    canvas.redraw()
+                    print("palette: {}".format(canvas.name))
+                if event.key == K_e:
+                    canvas.equalize = not canvas.equalize
+                    canvas.refresh()
+                    print("histogram equalized colors: {}".format(canvas.equalize))
+                if event.key == K_o:
+                    SMOOTH = not SMOOTH
+                    print("smooth coloring: {} (numpy and progressive)".format(SMOOTH))
+                if event.key == K_SPACE:
+                    cycle_flag = not cycle_flag
+                if event.key == K_RIGHT:
+                    canvas.cycle()
+                if event.key == K_LEFT:
+                    canvas.cycle(-CYCLE_STEP)
+                if event.key == K_y:
+                    SYMMETRY = not SYMMETRY
+                    print("symmetry: {}".format(SYMMETRY))
+                if event.key == K_t:
+                    timing.enable(not timing.ENABLED)
+                    print("timing: {}".format(timing.ENABLED))
 
                 if event.key == K_r:
                     # reset to original size
 
-                    fx_min, fx_max = -2.00, 0.5
-                    fy_min, fy_max = -1.2, 1.2 
-                        
-                    if FRACTAL == "julia":
-                        fx_min, fx_max = -1.5, 1.5
-                        fy_min, fy_max = -1.5, 1.5
+                    fx_min, fx_max, fy_min, fy_max = default_view(FRACTAL)
+                    dview = deepzoom.View.from_box(fx_min, fx_max, fy_min, fy_max, MAX_X, MAX_Y)
 
                     print("reset coordinates to {},{} - {},{}".format(fx_min, fy_min, fx_max, fy_max))
                     xc = MAX_X / (fx_max - fx_min)
                     yc = MAX_Y / (fy_max - fy_min)
 
+                    if job:
+                        job.cancel()
+                        job = None
+                        print("render cancelled")
+
 
                 if event.key == K_ESCAPE:
                     done = True
 
+    if job:
+        job.cancel()
+    pool.close()
+
 
 def peppermint():
     """compare loop versus numpy"""
@@ -546,20 +2045,25 @@ def peppermint():
     #a = np.zeros((MAX_X, MAX_Y))
     #x = np.linspace(fx_min, fx_max, MAX_X)
     #y = np.linspace(fy_min, fy_max, MAX_Y)
-    x = np.linspace(1, MAX_X, MAX_X)
-    y = np.linspace(1, MAX_Y, MAX_Y)
 
-    #def julia_px(px, py, xc, yc, fx_min, fy_min):
-    if FRACTAL == "mandelbrot":
-        fv = np.vectorize(mandelbrot_px)
-    elif FRACTAL == "julia":
-        fv = np.vectorize(julia_px)
-
-    r = fv(x[:, np.newaxis], y, xc, yc, fx_min, fy_min)
+    # np.vectorize = 17 sec, one python call per pixel
+    r = frame_np(xc, yc, fx_min, fy_min, mirror=False)
     print(r)
     print(r[300][300])
     print("done: {:.2f} sec, {:,} pixels".format(time.perf_counter() - s, MAX_X * MAX_Y))
 
+    # spot check against the per pixel function
+    fpx = mandelbrot_px if FRACTAL == "mandelbrot" else julia_px
+    bad = 0
+    for x in range(0, MAX_X, 7):
+        for y in range(0, MAX_Y, 7):
+            if fpx(x, y, xc, yc, fx_min, fy_min) != r[x][y]:
+                bad += 1
+    print("mismatched pixels: {}".format(bad))
+
+    # mariani-silver against the full frame
+    mariani_check(FRACTAL, xc, yc, fx_min, fy_min)
+
 
     sys.exit(0)
 
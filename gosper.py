@@ -3,9 +3,41 @@
 """
 https://en.wikipedia.org/wiki/Gosper_curve
 https://realpython.com/beginners-guide-python-turtle/
+
+turtle draws one segment at a time, order 4 is about as far as it goes
+- expand() rewrites the L-system a whole order at a time with numpy, no
+  recursion, vertices() turns the symbols into the curve's points with a
+  running sum of the turns and a running sum of the steps
+- rasterize() / write_svg() draw the points without a window, orders 7-8
+  (millions of segments) take seconds
+
+$ ./gosper.py                          turtle, order 4
+$ ./gosper.py -n 7 -o gosper.png       image, --palette colors it start to end
+$ ./gosper.py -n 6 -o gosper.svg       vector
 """
 
+import os
+import sys
+import time
+import argparse
 import turtle
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+import palette
+import cmdline
+
+
+# L-system, A and B step forward, + / - turn 60 degrees left / right
+RULES = {"A": "A-B--B+A++AA+B-", "B": "+A-BB--B-A++A+B"}
+SYMBOLS = "AB+-"
+TURNS = np.array([0, 0, 1, -1], dtype=np.int32) # per symbol, in 60 degrees
+
+# segments drawn per rasterize / svg chunk, bounds the temporary arrays
+CHUNK = 1 << 18
+
 
 def gosper_curve(order: int, size: int, is_A: bool = True) -> None:
     """Draw the Gosper curve."""
@@ -22,14 +54,144 @@ gosper_op_map = {
     "+": lambda o, size: turtle.left(60),
 }
 
-turtle.bgcolor("black")
-turtle.pencolor("purple")
-turtle.speed(10)
 
-size = 10
-order = 4
-gosper_curve(order, size)
+def expand(order):
+    """
+the curve's symbols after order rewrites, int8 codes into SYMBOLS
+- every symbol is replaced by its rule (a row of a table, turns are their
+  own rule) for the whole string at once
+    """
+
+    n = max(len(r) for r in RULES.values())
+    table = np.full((len(SYMBOLS), n), -1, dtype=np.int8)
+    for i, c in enumerate(SYMBOLS):
+        rule = RULES.get(c, c)
+        table[i, :len(rule)] = [SYMBOLS.index(r) for r in rule]
+
+    codes = np.zeros(1, dtype=np.int8) # "A"
+    for i in range(order):
+        rows = table[codes]
+        codes = rows[rows >= 0]
+    return codes
+
+
+def vertices(order, size=1.0):
+    """
+(segments + 1, 2) points of the curve, from 0,0 heading east like turtle
+- heading of every step = running sum of the turns before it
+    """
+
+    codes = expand(order)
+    heading = np.cumsum(TURNS[codes], dtype=np.int32)[codes < 2] % 6
+
+    angle = np.arange(6) * np.pi / 3
+    steps = size * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+
+    pts = np.zeros((heading.size + 1, 2))
+    np.cumsum(steps[heading], axis=0, out=pts[1:])
+    return pts
+
+
+def fit(pts, w, h, margin=0.05):
+    """scale, ox, oy putting pts in a w x h picture, pixel = (x * scale + ox, oy - y * scale)"""
+
+    lo = pts.min(axis=0)
+    hi = pts.max(axis=0)
+    scale = min(w * (1 - 2 * margin) / max(hi[0] - lo[0], 1e-12),
+                h * (1 - 2 * margin) / max(hi[1] - lo[1], 1e-12))
+    return scale, w / 2 - (lo[0] + hi[0]) / 2 * scale, h / 2 + (lo[1] + hi[1]) / 2 * scale
+
+
+def rasterize(pts, w, h, color=(128, 0, 128), name=None):
+    """
+the curve as a (w, h, 3) uint8 image
+- every segment is sampled about once per pixel of its length, CHUNK
+  segments at a time
+- name = palette that colors the curve from start to end, instead of color
+    """
+
+    scale, ox, oy = fit(pts, w, h)
+    img = np.zeros((w, h, 3), dtype=np.uint8)
+    lut = palette.make_lut(name) if name else None
+    n = len(pts) - 1
+
+    for s in range(0, n, CHUNK):
+        a = pts[s:s + CHUNK + 1] * (scale, -scale) + (ox, oy)
+        p0 = a[:-1]
+        d = a[1:] - p0
+
+        # samples per segment, both ends included
+        k = np.ceil(np.abs(d).max(axis=1)).astype(np.intp) + 1
+        seg = np.repeat(np.arange(k.size), k)
+        t = (np.arange(seg.size) - np.repeat(np.cumsum(k) - k, k)) / np.maximum(k - 1, 1)[seg]
+        x = np.rint(p0[seg, 0] + d[seg, 0] * t).astype(np.intp)
+        y = np.rint(p0[seg, 1] + d[seg, 1] * t).astype(np.intp)
+
+        ok = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+        if lut is None:
+            img[x[ok], y[ok]] = color
+        else:
+            img[x[ok], y[ok]] = lut[(s + seg[ok]) * (len(lut) - 1) // max(n - 1, 1)]
+
+    return img
+
+
+def write_svg(pts, out, w, h, color="purple"):
+    """the curve as one svg path, written CHUNK points at a time"""
+
+    scale, ox, oy = fit(pts, w, h)
+
+    with open(out, "w") as f:
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">\n'.format(w, h))
+        f.write('<rect width="100%" height="100%" fill="black"/>\n')
+        f.write('<path fill="none" stroke="{}" stroke-width="1" d="M'.format(color))
+        for s in range(0, len(pts), CHUNK):
+            a = pts[s:s + CHUNK] * (scale, -scale) + (ox, oy)
+            f.write(" ".join("{:.2f},{:.2f}".format(x, y) for x, y in a.tolist()))
+            f.write(" ")
+        f.write('"/>\n</svg>\n')
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="gosper curve, turtle or an image")
+    parser.add_argument("-n", "--order", type=int, default=4)
+    parser.add_argument("-o", "--out", help="no turtle, write .png or .svg")
+    parser.add_argument("-s", "--size", type=cmdline.size, default=(2000, 2000), help="WIDTHxHEIGHT of the image")
+    parser.add_argument("--palette", choices=sorted(palette.PALETTES), help="color from start to end, .png")
+    args = parser.parse_args(argv)
+
+    if not args.out:
+        turtle.bgcolor("black")
+        turtle.pencolor("purple")
+        turtle.speed(10)
+
+        gosper_curve(args.order, 10)
+
+        # wait for the window to be closed, without spinning
+        turtle.done()
+        return
+
+    s = time.perf_counter()
+    pts = vertices(args.order)
+    t = time.perf_counter() - s
+    print("order {}: {:,} segments, {:.2f} sec, {:.1f} MB of points".format(
+        args.order, len(pts) - 1, t, pts.nbytes / 1024 / 1024))
+
+    s = time.perf_counter()
+    ext = os.path.splitext(args.out)[1].lower()
+    if ext == ".svg":
+        write_svg(pts, args.out, *args.size)
+    elif ext == ".png":
+        img = rasterize(pts, *args.size, name=args.palette)
+        pygame.image.save(pygame.surfarray.make_surface(img), args.out)
+    else:
+        raise ValueError("unknown output type: {}".format(args.out))
+    print("{}: {:.2f} sec".format(args.out, time.perf_counter() - s))
+
+
+if __name__ == '__main__':
+
+    main()
 
-done = False
-while not done:
-    pass
+    sys.exit(0)
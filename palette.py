@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Color palettes as lookup tables
+- a palette is a list of color stops, make_lut() blends them into an
+  (n, 3) uint8 table once
+- counts (or smooth fractional counts) become integer keys, every key
+  gets a table position once (O(max_cnt)), then the whole array is colored
+  with one numpy index, ready for make_surface
+- cycling = an offset into the table, the counts don't change
+- histogram equalization only changes the key to position step, so the
+  histogram can be added up piece by piece while a frame is rendered
+
+    lut = palette.make_lut("fire")
+    rgb = palette.colorize(counts, lut, max_cnt, offset=10)
+"""
+
+import numpy as np
+
+
+LUT_SIZE = 256
+
+# keys per iteration count, smooth (fractional) counts are kept to 1/8
+KEY_STEPS = 8
+
+# name: [(position 0..1, (r, g, b)), ...]
+PALETTES = {
+    # the original look, count / max count as a grey shade
+    "grey": [(0.0, (0, 0, 0)), (1.0, (255, 255, 255))],
+    "fire": [(0.0, (0, 0, 0)), (0.3, (180, 0, 0)), (0.6, (255, 160, 0)), (0.85, (255, 255, 90)), (1.0, (255, 255, 255))],
+    "ocean": [(0.0, (0, 7, 100)), (0.16, (32, 107, 203)), (0.42, (237, 255, 255)), (0.64, (255, 170, 0)), (0.86, (0, 2, 0)), (1.0, (0, 7, 100))],
+    "rainbow": [(0.0, (255, 0, 0)), (0.17, (255, 255, 0)), (0.33, (0, 255, 0)), (0.5, (0, 255, 255)), (0.67, (0, 0, 255)), (0.83, (255, 0, 255)), (1.0, (255, 0, 0))],
+}
+
+# color of points that never escape, None = the end of the table like any count
+INSIDE = {
+    "grey": None,
+    "fire": (0, 0, 0),
+    "ocean": (0, 0, 0),
+    "rainbow": (0, 0, 0),
+}
+
+
+def make_lut(name, n=LUT_SIZE):
+    """(n, 3) uint8 table blended from the palette's color stops"""
+
+    stops = PALETTES[name]
+    pos = np.array([p for p, c in stops])
+    rgb = np.array([c for p, c in stops], dtype=np.float64)
+
+    t = np.linspace(0.0, 1.0, n)
+    lut = np.empty((n, 3), dtype=np.uint8)
+    for ch in range(3):
+        lut[:, ch] = np.rint(np.interp(t, pos, rgb[:, ch]))
+    return lut
+
+
+def count_keys(a, max_cnt):
+    """
+counts (int or float) to integer keys, uint32
+- key = count * KEY_STEPS, so smooth counts keep 1 / KEY_STEPS of a count
+- escaped counts are 0 .. max_cnt * KEY_STEPS - 1, inside (count >= max_cnt)
+  is max_cnt * KEY_STEPS, negative (nothing drawn yet) is one more
+    """
+
+    inside = max_cnt * KEY_STEPS
+    if a.dtype.kind == "f":
+        k = (a * KEY_STEPS).astype(np.int64)
+    else:
+        # widen first, uint16 counts (poster.py) would wrap above 8191
+        k = a.astype(np.int64) * KEY_STEPS
+    np.clip(k, 0, inside, out=k)
+    k[a < 0] = inside + 1
+    return k.astype(np.uint32)
+
+
+def key_histogram(keys, max_cnt):
+    """escaped pixels per key, length max_cnt * KEY_STEPS"""
+
+    n = max_cnt * KEY_STEPS
+    return np.bincount(keys.ravel(), minlength=n + 2)[:n]
+
+
+def key_positions(max_cnt, n=LUT_SIZE, offset=0, inside=False, hist=None):
+    """
+table() position for every key, the O(max_cnt) part of coloring
+- linear: count / max_cnt * (n - 1), so "grey" is the same shade as before
+- hist = key_histogram(), equalized instead: position from the share of
+  escaped pixels with the same or a lower count, every color gets about
+  as many pixels however high max_cnt is
+- offset rotates the positions (palette cycling)
+- inside = True: the inside key goes to n (the inside color), otherwise it
+  is a count of max_cnt, the key after it (nothing drawn) is black
+    """
+
+    k = np.arange(max_cnt * KEY_STEPS + 1)
+    if hist is None:
+        pos = (k / KEY_STEPS / max_cnt * (n - 1)).astype(np.intp)
+    else:
+        cdf = np.cumsum(hist, dtype=np.float64)
+        total = cdf[-1] if cdf.size and cdf[-1] > 0 else 1.0
+        pos = np.empty(k.size, dtype=np.intp)
+        pos[:-1] = cdf / total * (n - 1)
+        pos[-1] = n - 1
+    np.clip(pos, 0, n - 1, out=pos)
+
+    if offset:
+        pos = (pos + offset) % n
+    if inside:
+        pos[-1] = n
+    return np.append(pos, n + 1)
+
+
+def table(lut, inside=None):
+    """the lut plus the inside color and black, see key_positions()"""
+
+    extra = np.array([inside or (0, 0, 0), (0, 0, 0)], dtype=np.uint8)
+    return np.concatenate([lut, extra])
+
+
+def colorize(a, lut, max_cnt, offset=0, inside=None, equalize=False, hist=None, keys=None):
+    """
+counts to rgb, shape a.shape + (3,)
+- offset rotates the palette (palette cycling)
+- inside = color for count >= max_cnt, None = use the table
+- equalize = histogram equalized colors, see key_positions()
+- hist = key_histogram() to equalize with instead of a's, eg. the whole
+  frame's when a is only some extra samples of it
+- keys = count_keys(a, max_cnt) when the caller has them already
+    """
+
+    if keys is None:
+        keys = count_keys(a, max_cnt)
+    if equalize and hist is None:
+        hist = key_histogram(keys, max_cnt)
+    elif not equalize:
+        hist = None
+    pos = key_positions(max_cnt, len(lut), offset, inside is not None, hist)
+    return table(lut, inside)[pos][keys]
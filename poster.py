@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Poster renderer, any size (50k x 50k and up) in bounded memory
+- the counts go tile by tile into a memory mapped uint16 file on disk,
+  2 bytes per pixel and never all in RAM
+- finished tiles are recorded in a second small file, a render that was
+  stopped picks up from the tiles already done when run again
+- the image is colored and png encoded a band of rows at a time
+
+files for -o NAME:
+  NAME.u16   counts, uint16, row major (height, width), y = 0 first
+  NAME.tiles one byte per tile, 1 = done
+  NAME.json  the render settings, a resume must use the same ones
+  NAME.png   the image
+
+$ ./poster.py -f mandelbrot -s 50000x40000 -i 500 -o poster
+$ ./poster.py -f mandelbrot -s 20000x20000 -v -0.76 -0.72 0.09 0.13 --palette fire --equalize -o seahorse
+
+stop it any time (ctrl-c), the same command carries on where it was
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import argparse
+import numpy as np
+from multiprocessing import Pool, cpu_count
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import fractal
+import palette
+import cmdline
+
+
+TILE = 512 # tile side in pixels
+BAND = 64 # rows colored and encoded at a time
+FLUSH_SEC = 2.0 # counts are flushed and finished tiles recorded this often
+
+
+def tile_counts(job):
+    """worker, counts for one tile as uint16 (rows, columns)"""
+
+    name, c, xc, yc, fx_min, fy_min, max_cnt, fast, precision, t = job
+    fractal.JULIA_C = c
+    x0, y0, x1, y1 = t
+    x = np.arange(x0, x1)
+    y = np.arange(y0, y1)
+    a = fractal.fractal_np_map[name](x[:, np.newaxis], y, xc, yc, fx_min, fy_min, max_cnt, fast, precision=precision)
+    return t, a.T.astype(np.uint16)
+
+
+def make_tiles(w, h, tile=TILE):
+    """(x0, y0, x1, y1) for every tile, row of tiles by row of tiles"""
+
+    return [(x0, y0, min(x0 + tile, w), min(y0 + tile, h))
+            for y0 in range(0, h, tile)
+            for x0 in range(0, w, tile)]
+
+
+def open_poster(name, settings):
+    """
+counts and done tile memmaps, new or from an earlier run
+- an earlier run with other settings is an error, not overwritten
+    """
+
+    w, h = settings["width"], settings["height"]
+    n = len(make_tiles(w, h, settings["tile"]))
+
+    if os.path.exists(name + ".json"):
+        with open(name + ".json") as f:
+            old = json.load(f)
+        if old != settings:
+            raise ValueError("{}.json is for another render, use another name or --restart".format(name))
+        counts = np.memmap(name + ".u16", dtype=np.uint16, mode="r+", shape=(h, w))
+        done = np.memmap(name + ".tiles", dtype=np.uint8, mode="r+", shape=(n,))
+        return counts, done
+
+    counts = np.memmap(name + ".u16", dtype=np.uint16, mode="w+", shape=(h, w))
+    done = np.memmap(name + ".tiles", dtype=np.uint8, mode="w+", shape=(n,))
+    done.flush()
+    with open(name + ".json", "w") as f:
+        json.dump(settings, f, indent=1)
+    return counts, done
+
+
+def compute(name, settings, workers, fast=False):
+    """
+fill NAME.u16 with counts, skipping the tiles already done
+- tiles are recorded as done only after their counts were flushed
+    """
+
+    counts, done = open_poster(name, settings)
+    w, h = settings["width"], settings["height"]
+    tiles = make_tiles(w, h, settings["tile"])
+    index = {t: i for i, t in enumerate(tiles)}
+    todo = [t for i, t in enumerate(tiles) if not done[i]]
+    print("{}: {:,} x {:,}, {:,} tiles, {:,} done, {:,} to go".format(
+        name, w, h, len(tiles), len(tiles) - len(todo), len(todo)))
+
+    xc = w / (settings["view"][1] - settings["view"][0])
+    yc = h / (settings["view"][3] - settings["view"][2])
+    fx_min, fy_min = settings["view"][0], settings["view"][2]
+    c = complex(*settings["julia_c"])
+    jobs = [(settings["fractal"], c, xc, yc, fx_min, fy_min, settings["max_cnt"], fast, settings["precision"], t)
+            for t in todo]
+
+    s = time.perf_counter()
+    flushed = s
+    finished = [] # tiles written since the last flush
+    pixels = 0
+
+    def flush():
+        counts.flush()
+        for t in finished:
+            done[index[t]] = 1
+        done.flush()
+        finished.clear()
+
+    with Pool(workers) as pool:
+        try:
+            for t, a in pool.imap_unordered(tile_counts, jobs):
+                x0, y0, x1, y1 = t
+                counts[y0:y1, x0:x1] = a
+                finished.append(t)
+                pixels += a.size
+
+                now = time.perf_counter()
+                if now - flushed > FLUSH_SEC:
+                    flush()
+                    flushed = now
+                    left = int(len(done) - done.sum())
+                    rate = pixels / (now - s)
+                    print("{:,} tiles to go, {:,.0f} pixels/sec, {:.0f} sec left".format(
+                        left, rate, left * settings["tile"] ** 2 / rate), flush=True)
+        finally:
+            # what finished so far counts, also when interrupted
+            flush()
+
+    t = time.perf_counter() - s
+    if pixels:
+        print("counts: {:,} pixels in {:.1f} sec, {:,.0f} pixels/sec".format(pixels, t, pixels / t))
+    return counts
+
+
+def write_png(out, w, h, bands):
+    """
+png from bands of rows, (rows, w, 3) uint8 each, encoded as they come
+- only one band and the compressor are in memory
+    """
+
+    def chunk(f, kind, data):
+        f.write(struct.pack(">I", len(data)))
+        f.write(kind + data)
+        f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    with open(out, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        chunk(f, b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+        z = zlib.compressobj(6)
+        for rgb in bands:
+            # filter byte 0 (none) in front of every row
+            rows = np.zeros((rgb.shape[0], w * 3 + 1), dtype=np.uint8)
+            rows[:, 1:] = rgb.reshape(rgb.shape[0], -1)
+            data = z.compress(rows.tobytes())
+            if data:
+                chunk(f, b"IDAT", data)
+        chunk(f, b"IDAT", z.flush())
+        chunk(f, b"IEND", b"")
+
+
+def color(counts, out, settings, name="grey", equalize=False):
+    """color counts a BAND of rows at a time into the png out"""
+
+    s = time.perf_counter()
+    h, w = counts.shape
+    max_cnt = settings["max_cnt"]
+    lut = palette.make_lut(name)
+    inside = palette.INSIDE[name]
+
+    hist = None
+    if equalize:
+        # one pass for the histogram of the whole poster
+        hist = np.zeros(max_cnt * palette.KEY_STEPS, dtype=np.int64)
+        for y0 in range(0, h, BAND):
+            hist += palette.key_histogram(palette.count_keys(counts[y0:y0 + BAND], max_cnt), max_cnt)
+
+    def bands():
+        for y0 in range(0, h, BAND):
+            yield palette.colorize(counts[y0:y0 + BAND], lut, max_cnt, inside=inside, equalize=equalize, hist=hist)
+
+    write_png(out, w, h, bands())
+    print("{}: {:.1f} sec".format(out, time.perf_counter() - s))
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="tiled poster render, memory mapped counts, resumable")
+    parser.add_argument("-f", "--fractal", choices=sorted(fractal.fractal_np_map), default=fractal.FRACTAL)
+    parser.add_argument("-i", "--iterations", type=int, default=fractal.MAX_CNT, help="MAX_CNT, at most 65535")
+    parser.add_argument("-s", "--size", type=cmdline.size, default=(20000, 16000), help="WIDTHxHEIGHT")
+    parser.add_argument("-v", "--view", type=float, nargs=4, metavar=("XMIN", "XMAX", "YMIN", "YMAX"))
+    parser.add_argument("--julia-c", type=float, nargs=2, metavar=("RE", "IM"), help="julia constant, default {}".format(fractal.JULIA_C))
+    parser.add_argument("-o", "--out", default="poster", help="name of the .u16 / .tiles / .json / .png files")
+    parser.add_argument("-t", "--tile", type=int, default=TILE)
+    parser.add_argument("-w", "--workers", type=int, default=cpu_count())
+    parser.add_argument("--fast", action="store_true", help="cardioid / bulb / periodicity shortcuts")
+    parser.add_argument("--precision", choices=fractal.PRECISIONS, default=fractal.PRECISION)
+    parser.add_argument("--palette", choices=sorted(palette.PALETTES), default=fractal.PALETTE)
+    parser.add_argument("--equalize", action="store_true", help="histogram equalized colors")
+    parser.add_argument("--no-image", action="store_true", help="only compute the counts")
+    parser.add_argument("--restart", action="store_true", help="throw away an earlier run of the same name")
+    args = parser.parse_args(argv)
+
+    if args.iterations > np.iinfo(np.uint16).max:
+        parser.error("counts are uint16, at most 65535 iterations")
+
+    fractal.configure(julia_c=complex(*args.julia_c) if args.julia_c else None)
+    view = args.view or fractal.default_view(args.fractal)
+    settings = {
+        "fractal": args.fractal,
+        "width": args.size[0],
+        "height": args.size[1],
+        "view": list(view),
+        "max_cnt": args.iterations,
+        "julia_c": [fractal.JULIA_C.real, fractal.JULIA_C.imag],
+        "precision": args.precision,
+        "tile": args.tile,
+    }
+
+    if args.restart:
+        for ext in (".json", ".u16", ".tiles"):
+            if os.path.exists(args.out + ext):
+                os.remove(args.out + ext)
+
+    try:
+        counts = compute(args.out, settings, args.workers, args.fast)
+    except KeyboardInterrupt:
+        print("stopped, run the same command again to carry on")
+        return
+
+    if not args.no_image:
+        color(counts, args.out + ".png", settings, args.palette, args.equalize)
+
+
+if __name__ == '__main__':
+
+    main()
+
+    sys.exit(0)
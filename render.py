@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Headless fractal renderer
+- same engines as fractal.py, no window, writes an image or the raw counts
+- output type from the file name:
+  - .png = image through a palette (--palette, default the grey of fractal.py)
+  - .npy = counts as a numpy array, shape (width, height)
+  - .raw = counts as little endian uint16, width * height, x major.  Only
+    for MAX_CNT up to 65535 and whole counts (no --smooth), .npy keeps any
+
+$ ./render.py -f mandelbrot --size 2000x1600 -i 500 -e mp -o m.png
+$ ./render.py -f julia --view -0.5 0.5 -0.5 0.5 -e numpy -o j.npy
+
+batch file, one render per line: xmin xmax ymin ymax output
+$ ./render.py -f mandelbrot -e mp --batch views.txt
+
+deep zoom, perturbation engine, the center keeps every digit given
+$ ./render.py -e deep -i 3000 --center -0.743643887037158704752191506114774 0.131825904205311970493132056385139 --width 1e-25 -o d.png
+
+anti-aliased, 4x4 samples only where neighbouring counts differ
+$ ./render.py -f mandelbrot -i 500 -v -0.7436 -0.7434 0.1316 0.13176 --aa 4 --palette fire -o aa.png
+
+--auto picks the iterations for every view, deeper views get more
+$ ./render.py -f mandelbrot --auto -v -0.7436 -0.7434 0.1316 0.13176 -o a.png
+
+timing is printed for every render so engines can be compared
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+import fractal
+import timing
+import deepzoom
+import palette
+import cmdline
+
+
+# engine name to function returning counts, v = (xc, yc, fx_min, fy_min)
+# "deep" is not in here, it takes a deepzoom.View instead
+engine_map = {
+    "loop": lambda v, fast, pool: fractal.frame_loop(*v, fast=fast),
+    "numpy": lambda v, fast, pool: fractal.frame_np(*v, fast=fast, smooth=fractal.SMOOTH),
+    "mp": lambda v, fast, pool: pool.render(fractal.FRACTAL, *v, fast=fast)[0],
+    "mariani": lambda v, fast, pool: fractal.mariani_silver(fractal.FRACTAL, *v, fast=fast)[0],
+    "cached": lambda v, fast, pool: frame_cached(*v, fast=fast),
+}
+
+
+def frame_cached(xc, yc, fx_min, fy_min, fast=False):
+    """whole screen through the tile cache, counts"""
+
+    a = np.zeros((fractal.MAX_X, fractal.MAX_Y), dtype=np.int32)
+    for x, y, t in fractal.cached_tiles(fractal.TILE_CACHE, fractal.FRACTAL, xc, yc, fx_min, fy_min, fast=fast):
+        a[x:x + t.shape[0], y:y + t.shape[1]] = t
+    return a
+
+
+def save(a, out, aa=None):
+    """
+write counts to out, type from the extension
+- aa = fractal.supersample() samples, averaged into the .png
+    """
+
+    ext = os.path.splitext(out)[1].lower()
+
+    if ext == ".npy":
+        np.save(out, a)
+    elif ext == ".raw":
+        # uint16 would wrap bigger counts and cut smooth ones
+        if a.dtype.kind == "f":
+            raise ValueError("{}: .raw is whole counts only, use .npy for --smooth".format(out))
+        if fractal.MAX_CNT > np.iinfo(np.uint16).max:
+            raise ValueError("{}: .raw counts are uint16, at most 65535 iterations, MAX_CNT is {}, use .npy".format(
+                out, fractal.MAX_CNT))
+        a.astype("<u2").tofile(out)
+    elif ext == ".png":
+        lut = palette.make_lut(fractal.PALETTE)
+        inside = palette.INSIDE[fractal.PALETTE]
+
+        with timing.stage("color"):
+            # one pass over the frame for its keys, the histogram and the colors
+            # both use them.  The samples are colored with the frame's histogram
+            keys = palette.count_keys(a, fractal.MAX_CNT)
+            hist = palette.key_histogram(keys, fractal.MAX_CNT) if fractal.EQUALIZE else None
+
+            def color(c, keys=None):
+                return palette.colorize(c, lut, fractal.MAX_CNT, inside=inside, equalize=fractal.EQUALIZE,
+                                        hist=hist, keys=keys)
+
+            rgb = color(a, keys)
+            if aa:
+                fractal.antialias(rgb, aa, color)
+        surf = pygame.surfarray.make_surface(rgb)
+        pygame.image.save(surf, out)
+    else:
+        raise ValueError("unknown output type: {}".format(out))
+
+
+def render(engine, view, out, fast=False, pool=None, auto=None, check=False, aa=0):
+    """
+render one view to out, returns seconds
+- view = (fx_min, fx_max, fy_min, fy_max), numbers or strings, or a deepzoom.View
+- auto = MAX_CNT to replace with fractal.auto_max_cnt() for this view, None = keep MAX_CNT
+- float32 renders print the pixels that differ from float64, check = count
+  them over the whole frame instead of a sample, and compare a mariani
+  render with the brute force frame
+- aa = anti-aliasing samples per side for the edges of a .png, 0 = off
+    """
+
+    if isinstance(view, deepzoom.View):
+        dview = view
+        view = view.box(fractal.MAX_X, fractal.MAX_Y)
+    else:
+        dview = deepzoom.View.from_box(*view, fractal.MAX_X, fractal.MAX_Y)
+
+    if auto and engine == "deep":
+        fractal.MAX_CNT = fractal.auto_max_cnt(0, 0, 0, 0, dview, auto)
+
+    s = time.perf_counter()
+    if engine == "deep":
+        stats = {}
+        a = fractal.frame_deep(dview, stats=stats)
+        print("{}, reference {} iterations, {:,} glitch rebases".format(dview, stats["reference"], stats["rebases"]))
+    else:
+        # floats from here, the view can be too deep for them (xc = inf)
+        fx_min, fx_max, fy_min, fy_max = (float(v) for v in view)
+        xc = fractal.MAX_X / (fx_max - fx_min) if fx_max > fx_min else math.inf
+        yc = fractal.MAX_Y / (fy_max - fy_min) if fy_max > fy_min else math.inf
+        if auto:
+            fractal.MAX_CNT = fractal.auto_max_cnt(xc, yc, fx_min, fy_min, fixed=auto)
+        a = engine_map[engine]((xc, yc, fx_min, fy_min), fast, pool)
+    t = time.perf_counter() - s
+
+    if engine not in ("loop", "deep"):
+        fractal.precision_check(fractal.FRACTAL, xc, yc, fx_min, fy_min, a=a if check else None)
+    if check and engine == "mariani":
+        fractal.mariani_check(fractal.FRACTAL, xc, yc, fx_min, fy_min, a=a)
+
+    # the anti-aliasing samples are part of the render's cost
+    samples = None
+    if aa and out.lower().endswith(".png"):
+        s = time.perf_counter()
+        if engine == "deep":
+            samples = fractal.supersample(a, 0, 0, 0, 0, aa, view=dview)
+        else:
+            samples = fractal.supersample(a, xc, yc, fx_min, fy_min, aa, fast=fast, smooth=a.dtype.kind == "f")
+        t += time.perf_counter() - s
+
+    with timing.stage("save"):
+        save(a, out, samples)
+
+    pixels = fractal.MAX_X * fractal.MAX_Y
+    print("{}: {} {:.2f} sec, {:,} pixels, {:,.0f} pixels/sec".format(out, engine, t, pixels, pixels / t))
+    return t
+
+
+def read_batch(fname):
+    """batch file lines: xmin xmax ymin ymax output, # for comments, numbers kept as text"""
+
+    jobs = []
+    with open(fname) as f:
+        for line in f:
+            line = line.split("#")[0].split()
+            if not line:
+                continue
+            if len(line) != 5:
+                raise ValueError("bad batch line: {}".format(" ".join(line)))
+            jobs.append((tuple(cmdline.number(v) for v in line[:4]), line[4]))
+    return jobs
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="render a fractal without a display")
+    parser.add_argument("-f", "--fractal", choices=sorted(fractal.fractal_np_map), default=fractal.FRACTAL)
+    parser.add_argument("-e", "--engine", choices=sorted(engine_map) + ["deep"], default="numpy")
+    parser.add_argument("-i", "--iterations", type=int, default=fractal.MAX_CNT, help="MAX_CNT")
+    parser.add_argument("-s", "--size", type=cmdline.size, default=(fractal.MAX_X, fractal.MAX_Y), help="WIDTHxHEIGHT")
+    parser.add_argument("-v", "--view", type=cmdline.number, nargs=4, metavar=("XMIN", "XMAX", "YMIN", "YMAX"))
+    parser.add_argument("--julia-c", type=float, nargs=2, metavar=("RE", "IM"), help="julia constant, default {}".format(fractal.JULIA_C))
+    parser.add_argument("--center", type=cmdline.number, nargs=2, metavar=("X", "Y"), help="view center, any number of digits")
+    parser.add_argument("--width", type=float, default=1.0, help="view width for --center")
+    parser.add_argument("-o", "--out", default="fractal.png", help=".png, .npy or .raw")
+    parser.add_argument("-b", "--batch", help="file of views to render, see above")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="producers for -e mp")
+    parser.add_argument("--fast", action="store_true", help="cardioid / bulb / periodicity shortcuts")
+    parser.add_argument("--palette", choices=sorted(palette.PALETTES), default=fractal.PALETTE, help="for .png")
+    parser.add_argument("--equalize", action="store_true", help="histogram equalized .png colors")
+    parser.add_argument("--smooth", action="store_true", help="fractional counts, -e numpy")
+    parser.add_argument("--precision", choices=fractal.PRECISIONS, default=fractal.PRECISION,
+                        help="float type of the array engines, auto = float32 while it is safe (faster, a few pixels differ)")
+    parser.add_argument("--check", action="store_true", help="compare the whole frame with float64, not a sample, -e mariani also with brute force")
+    parser.add_argument("--aa", type=int, default=0, metavar="N", help="anti-alias .png edges with N x N samples")
+    parser.add_argument("--aa-filter", choices=("box", "gauss"), default=fractal.AA_FILTER)
+    parser.add_argument("--aa-threshold", type=float, default=fractal.AA_THRESHOLD,
+                        help="count difference to a neighbour that makes an edge pixel")
+    parser.add_argument("--auto", action="store_true", help="pick -i per view from the zoom and a sample pass")
+    parser.add_argument("--symmetry", action="store_true", help="mirror symmetric halves, a few pixels can differ")
+    parser.add_argument("--timing", action="store_true", help="print per stage times and counters per render")
+    parser.add_argument("--trace", help="save a chrome trace json of all renders")
+    args = parser.parse_args(argv)
+
+    timing.enable(args.timing or bool(args.trace))
+
+    fractal.configure(args.fractal, args.iterations, *args.size, julia_c=complex(*args.julia_c) if args.julia_c else None)
+    fractal.SYMMETRY = args.symmetry
+    fractal.PRECISION = args.precision
+    fractal.AA_FILTER = args.aa_filter
+    fractal.AA_THRESHOLD = args.aa_threshold
+    fractal.PALETTE = args.palette
+    fractal.SMOOTH = args.smooth
+    fractal.EQUALIZE = args.equalize
+
+    if args.batch:
+        jobs = read_batch(args.batch)
+    elif args.center:
+        dx = args.width / fractal.MAX_X
+        jobs = [(deepzoom.View(args.center[0], args.center[1], dx, dx), args.out)]
+    else:
+        jobs = [(tuple(args.view) if args.view else fractal.default_view(args.fractal), args.out)]
+
+    pool = None
+    if args.engine == "mp":
+        pool = fractal.RenderPool(args.workers)
+
+    s = time.perf_counter()
+    try:
+        for view, out in jobs:
+            render(args.engine, view, out, args.fast, pool, args.iterations if args.auto else None, args.check, args.aa)
+            if args.timing:
+                timing.summary(out)
+    finally:
+        if pool:
+            pool.close()
+
+    if len(jobs) > 1:
+        print("{} renders: {:.2f} sec".format(len(jobs), time.perf_counter() - s))
+
+    if args.trace:
+        timing.save_trace(args.trace)
+
+
+if __name__ == '__main__':
+
+    main()
+
+    sys.exit(0)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Julia set sweep, one image per c value, no window
+- c values on a grid, along a path, from a file or picked near the edge of
+  the mandelbrot set in a view (where the julia sets are interesting)
+- the sets are rendered by a process pool, every image is written by its
+  worker as soon as it is done and listed in an index (csv)
+- connectedness precheck: the julia set of c is connected exactly when c
+  is in the mandelbrot set, so the critical orbit (z = 0) of every c is
+  iterated once up front; when it escapes the set is dust and is skipped
+  or rendered as a THUMB times smaller thumbnail (--precheck)
+- julia sets are symmetric about the origin, with --symmetry a view around
+  it computes one half and mirrors the other (fractal.frame_np)
+
+$ ./sweep.py --grid -1 0.5 -1 1 8 8 -o "sweep/j_{n:04d}.png"
+$ ./sweep.py --path -0.8 0.156 -0.4 0.6 0.285 0.01 -n 120 -s 320x320 -o "path/j_{n:04d}.png"
+$ ./sweep.py --pick -0.76 -0.72 0.09 0.13 -n 32 --at-c 0.05 --palette fire
+                           c near the edge of seahorse valley, each julia
+                           view centered on its c, 0.05 wide
+
+output names are formatted with n (c number), re and im, eg. "j_{re:+.4f}_{im:+.4f}.png"
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+import numpy as np
+from multiprocessing import Pool, cpu_count
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+import fractal
+import palette
+import cmdline
+
+
+THUMB = 4 # dust sets are rendered this many times smaller each way (--precheck thumb)
+PRECHECKS = ("thumb", "skip", "off")
+PICK_SIZE = (400, 320) # mandelbrot pixels looked at by pick()
+
+
+def grid(re0, re1, im0, im1, nx, ny):
+    """nx x ny c values, row by row from re0 + im0 i to re1 + im1 i"""
+
+    re = np.linspace(re0, re1, nx)
+    im = np.linspace(im0, im1, ny)
+    return [complex(r, i) for i in im for r in re]
+
+
+def path(points, n):
+    """n c values evenly spaced (by length) along the polyline through points"""
+
+    p = np.array(points, dtype=np.complex128)
+    if p.size == 1:
+        return [complex(p[0])] * n
+    step = np.abs(np.diff(p))
+    at = np.concatenate([[0.0], np.cumsum(step)])
+    u = np.linspace(0.0, at[-1], n)
+    k = np.clip(np.searchsorted(at, u, side="right") - 1, 0, step.size - 1)
+    t = (u - at[k]) / np.maximum(step[k], 1e-300)
+    return [complex(c) for c in p[k] + (p[k + 1] - p[k]) * t]
+
+
+def read_cs(fname):
+    """c values from a text file, "re im" per line, # comments"""
+
+    cs = []
+    with open(fname) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if line:
+                re, im = line.split()[:2]
+                cs.append(complex(float(re), float(im)))
+    return cs
+
+
+def pick(view, n, max_cnt=None, size=PICK_SIZE):
+    """
+n c values from a mandelbrot view, on the inside edge of the set
+- edge = pixels that don't escape next to one that does, their julia sets
+  are connected and the most detailed, spread evenly over all of them
+  (x major)
+    """
+
+    if max_cnt is None:
+        max_cnt = fractal.MAX_CNT
+
+    w, h = size
+    x = np.arange(w)
+    y = np.arange(h)
+    xc = w / (view[1] - view[0])
+    yc = h / (view[3] - view[2])
+    a = fractal.mandelbrot_np(x[:, np.newaxis], y, xc, yc, view[0], view[2], max_cnt, fast=True, precision="float64")
+
+    outside = a < max_cnt
+    near = np.zeros_like(outside)
+    near[1:] |= outside[:-1]
+    near[:-1] |= outside[1:]
+    near[:, 1:] |= outside[:, :-1]
+    near[:, :-1] |= outside[:, 1:]
+    gx, gy = np.nonzero(near & ~outside)
+    if gx.size == 0:
+        raise ValueError("no edge of the mandelbrot set in view {}".format(view))
+
+    k = np.unique(np.linspace(0, gx.size - 1, n).round().astype(np.intp))
+    return [complex(px / xc + view[0], py / yc + view[2]) for px, py in zip(gx[k], gy[k])]
+
+
+def connected(cs, max_cnt=None):
+    """
+critical orbit escape count of every c, max_cnt = connected julia set
+- the orbit of z = 0 under z**2 + c is the mandelbrot iteration at c
+    """
+
+    c = np.asarray(cs, dtype=np.complex128)
+    return fractal.mandelbrot_np(c.real, c.imag, 1.0, 1.0, 0.0, 0.0, max_cnt, fast=True, precision="float64")
+
+
+def julia_counts(c, w, h, view, max_cnt=None, fast=False, precision=None, mirror=False):
+    """
+counts (w, h) of the julia set of c over view (fx_min, fx_max, fy_min, fy_max)
+- mirror = the part of the view mirrored about the origin is copied, not
+  computed, see fractal.symmetry()
+    """
+
+    xc = w / (view[1] - view[0])
+    yc = h / (view[3] - view[2])
+    return fractal.frame_np(xc, yc, view[0], view[2], max_cnt, fast, mirror,
+                            fractal="julia", w=w, h=h, c=c, precision=precision)
+
+
+def julia_image(job):
+    """
+worker, renders one c and writes its image
+- returns (n, c, escape, out, kind, sec), kind = "full", "thumb" or "skip"
+    """
+
+    n, c, escape, out, kind, w, h, view, max_cnt, fast, precision, mirror, name = job
+    s = time.perf_counter()
+
+    if kind != "skip":
+        if kind == "thumb":
+            tw, th = -(-w // THUMB), -(-h // THUMB)
+            a = julia_counts(c, tw, th, view, max_cnt, fast, precision, mirror)
+            a = np.repeat(np.repeat(a, THUMB, axis=0), THUMB, axis=1)[:w, :h]
+        else:
+            a = julia_counts(c, w, h, view, max_cnt, fast, precision, mirror)
+        rgb = palette.colorize(a, palette.make_lut(name), max_cnt, inside=palette.INSIDE[name])
+        pygame.image.save(pygame.surfarray.make_surface(rgb), out)
+
+    return n, c, escape, out, kind, time.perf_counter() - s
+
+
+def sweep(cs, out, w, h, view=None, at_c=None, max_cnt=None, workers=None, precheck="thumb",
+          fast=False, precision=None, mirror=False, name="grey", index=None):
+    """
+julia set images for every c in cs, returns stats
+- out = image name pattern, formatted with n, re and im
+- view = julia view (fx_min, fx_max, fy_min, fy_max), default
+  fractal.default_view("julia"), at_c = a view at_c wide centered on each c
+  instead
+- precheck = "thumb" / "skip" dust sets (critical orbit escapes) or "off"
+- mirror = copy the half of a view mirrored about the origin
+- index = csv written a line per set as they finish, n re im escape kind
+  image sec
+    """
+
+    if max_cnt is None:
+        max_cnt = fractal.MAX_CNT
+    if view is None:
+        view = fractal.default_view("julia")
+    if precheck not in PRECHECKS:
+        raise ValueError("unknown precheck: {}".format(precheck))
+
+    s = time.perf_counter()
+    escape = connected(cs, max_cnt)
+    check = time.perf_counter() - s
+    dust = int((escape < max_cnt).sum())
+    print("precheck: {:,} c values, {:,} connected, {:,} dust, {:.3f} sec".format(
+        len(cs), len(cs) - dust, dust, check))
+
+    jobs = []
+    for n, c in enumerate(cs):
+        kind = "full"
+        if precheck != "off" and escape[n] < max_cnt:
+            kind = precheck
+        v = view
+        if at_c:
+            v = (c.real - at_c / 2, c.real + at_c / 2, c.imag - at_c / 2 * h / w, c.imag + at_c / 2 * h / w)
+        fname = out.format(n=n, re=c.real, im=c.imag)
+        jobs.append((n, c, int(escape[n]), fname, kind, w, h, v, max_cnt, fast, precision, mirror, name))
+
+    for d in sorted({os.path.dirname(j[3]) for j in jobs if j[4] != "skip"}):
+        if d:
+            os.makedirs(d, exist_ok=True)
+
+    # connected sets are the slow ones, started first so the pool ends evenly
+    order = {"full": 0, "thumb": 1, "skip": 2}
+    jobs.sort(key=lambda j: order[j[4]])
+
+    stats = {"full": 0, "thumb": 0, "skip": 0}
+    f = open(index, "w", newline="") if index else None
+    try:
+        log = csv.writer(f) if f else None
+        if log:
+            log.writerow(["n", "re", "im", "escape", "kind", "image", "sec"])
+
+        with Pool(workers or cpu_count()) as pool:
+            for n, c, esc, fname, kind, t in pool.imap_unordered(julia_image, jobs):
+                stats[kind] += 1
+                if log:
+                    log.writerow([n, repr(c.real), repr(c.imag), esc, kind, fname if kind != "skip" else "", "{:.4f}".format(t)])
+                    f.flush()
+                if kind != "skip":
+                    print("{}: c = {:.6f}, {} {:.2f} sec".format(fname, c, kind, t), flush=True)
+    finally:
+        if f:
+            f.close()
+
+    stats["sec"] = time.perf_counter() - s
+    stats["precheck sec"] = check
+    return stats
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="julia set for every c of a grid, path, file or mandelbrot view, in parallel")
+    cs = parser.add_mutually_exclusive_group(required=True)
+    cs.add_argument("--grid", type=float, nargs=6, metavar=("RE0", "RE1", "IM0", "IM1", "NX", "NY"), help="c on a grid")
+    cs.add_argument("--path", type=float, nargs="+", metavar="RE IM", help="c along the line through these points, -n of them")
+    cs.add_argument("--file", help="c values, \"re im\" per line")
+    cs.add_argument("--pick", type=float, nargs=4, metavar=("XMIN", "XMAX", "YMIN", "YMAX"),
+                    help="-n c values on the edge of the mandelbrot set in this view")
+    parser.add_argument("-n", "--count", type=int, default=60, help="c values for --path / --pick")
+    parser.add_argument("-i", "--iterations", type=int, default=fractal.MAX_CNT, help="MAX_CNT")
+    parser.add_argument("-s", "--size", type=cmdline.size, default=(400, 400), help="WIDTHxHEIGHT of every image")
+    parser.add_argument("-v", "--view", type=float, nargs=4, metavar=("XMIN", "XMAX", "YMIN", "YMAX"), help="julia view")
+    parser.add_argument("--at-c", type=float, metavar="WIDTH", help="center every julia view on its c, WIDTH wide")
+    parser.add_argument("-o", "--out", default="sweep/julia_{n:04d}.png", help="image names, {n} {re} {im}")
+    parser.add_argument("--index", help="csv of every c and its image, default sweep.csv next to the images")
+    parser.add_argument("-w", "--workers", type=int, default=cpu_count())
+    parser.add_argument("--precheck", choices=PRECHECKS, default="thumb",
+                        help="dust sets (critical orbit escapes): 1/{} size thumbnail, skipped or rendered in full".format(THUMB))
+    parser.add_argument("--fast", action="store_true", help="periodicity check")
+    parser.add_argument("--precision", choices=fractal.PRECISIONS, default=fractal.PRECISION)
+    parser.add_argument("--symmetry", action="store_true", help="mirror the half of a view around the origin, a few pixels can differ")
+    parser.add_argument("--palette", choices=sorted(palette.PALETTES), default=fractal.PALETTE)
+    args = parser.parse_args(argv)
+
+    fractal.configure(max_cnt=args.iterations)
+
+    if args.grid:
+        re0, re1, im0, im1, nx, ny = args.grid
+        cs = grid(re0, re1, im0, im1, int(nx), int(ny))
+    elif args.path:
+        if len(args.path) % 2:
+            parser.error("--path takes RE IM pairs")
+        cs = path([complex(re, im) for re, im in zip(args.path[::2], args.path[1::2])], args.count)
+    elif args.file:
+        cs = read_cs(args.file)
+    else:
+        cs = pick(args.pick, args.count)
+
+    index = args.index or os.path.join(os.path.dirname(args.out), "sweep.csv")
+    w, h = args.size
+    stats = sweep(cs, args.out, w, h, args.view, args.at_c, args.iterations, args.workers, args.precheck,
+                  args.fast, args.precision, args.symmetry, args.palette, index)
+
+    sets = stats["full"] + stats["thumb"]
+    print("{}: {:,} sets ({:,} full, {:,} thumbnails, {:,} skipped) in {:.1f} sec, {:.1f} sets/minute, {:,.0f} pixels/sec".format(
+        index, sets, stats["full"], stats["thumb"], stats["skip"], stats["sec"],
+        sets / stats["sec"] * 60, (stats["full"] + stats["thumb"] / THUMB ** 2) * w * h / stats["sec"]))
+
+
+if __name__ == '__main__':
+
+    main()
+
+    sys.exit(0)
@@ -0,0 +1,97 @@
+#! -*- coding: utf-8 -*-
+
+"""
+regression checks, run with pytest from this directory
+"""
+
+import pytest
+import numpy as np
+
+import fractal
+import deepzoom
+import palette
+
+
+def test_auto_max_cnt_deep(monkeypatch):
+    """a deep view where no sample escapes at the first guess isn't capped below its counts"""
+
+    monkeypatch.setattr(fractal, "FRACTAL", "mandelbrot")
+    monkeypatch.setattr(fractal, "MAX_X", 320)
+    monkeypatch.setattr(fractal, "MAX_Y", 256)
+    view = deepzoom.View("-0.7436438870371587052", "0.1318259042053119770", 1e-18, 1e-18)
+
+    # perturbation samples of this view escape from about 5100 iterations on
+    assert fractal.auto_max_cnt(None, None, None, None, view=view) > 5200
+
+
+@pytest.mark.parametrize("name", ["mandelbrot", "julia"])
+def test_frame_np_matches_loop(monkeypatch, name):
+    """the array engine at its default precision gives the per pixel functions' counts"""
+
+    monkeypatch.setattr(fractal, "FRACTAL", name)
+    monkeypatch.setattr(fractal, "MAX_X", 250)
+    monkeypatch.setattr(fractal, "MAX_Y", 200)
+    fx_min, fx_max, fy_min, fy_max = fractal.default_view(name)
+    v = (250 / (fx_max - fx_min), 200 / (fy_max - fy_min), fx_min, fy_min)
+
+    assert (fractal.frame_np(*v) == fractal.frame_loop(*v)).all()
+
+
+@pytest.mark.parametrize("name", ["mandelbrot", "julia"])
+def test_mariani_check(monkeypatch, name):
+    """Mariani-Silver fills at most a pixel in 100,000 wrongly on the default views"""
+
+    monkeypatch.setattr(fractal, "FRACTAL", name)
+    fx_min, fx_max, fy_min, fy_max = fractal.default_view(name)
+    xc = fractal.MAX_X / (fx_max - fx_min)
+    yc = fractal.MAX_Y / (fy_max - fy_min)
+
+    assert fractal.mariani_check(name, xc, yc, fx_min, fy_min) <= fractal.MAX_X * fractal.MAX_Y // 100000
+
+
+def test_count_keys_uint16():
+    """uint16 counts (poster.py) above 65535 / KEY_STEPS don't wrap"""
+
+    keys = palette.count_keys(np.array([[10000, 65535]], np.uint16), 65535)
+
+    assert keys.tolist() == [[10000 * palette.KEY_STEPS, 65535 * palette.KEY_STEPS]]
+
+
+@pytest.mark.parametrize("name, view, c", [
+    ("mandelbrot", None, None),
+    ("mandelbrot", (-0.2, 0.0, 0.65, 0.8), None),
+    ("mandelbrot", (-1.8, -1.7, -0.04, 0.04), None),
+    ("julia", None, -1 + 0.1j),
+])
+def test_fast_path_same_counts(monkeypatch, name, view, c):
+    """the cardioid / bulb skips and the periodicity check change no count"""
+
+    monkeypatch.setattr(fractal, "FAST_STATS", {k: 0 for k in fractal.FAST_STATS})
+    monkeypatch.setattr(fractal, "MAX_X", 250)
+    monkeypatch.setattr(fractal, "MAX_Y", 200)
+    fx_min, fx_max, fy_min, fy_max = view or fractal.default_view(name)
+    v = (250 / (fx_max - fx_min), 200 / (fy_max - fy_min), fx_min, fy_min)
+
+    fast = fractal.frame_np(*v, max_cnt=500, fast=True, fractal=name, c=c)
+    # the view has pixels the fast path skips
+    assert sum(fractal.FAST_STATS.values()) > 0
+    assert (fast == fractal.frame_np(*v, max_cnt=500, fractal=name, c=c)).all()
+
+
+def test_canvas_histogram_progressive(monkeypatch):
+    """the histogram the Canvas adds up piece by piece is the whole frame's, progressive overwrites too"""
+
+    monkeypatch.setattr(fractal, "FRACTAL", "mandelbrot")
+    monkeypatch.setattr(fractal, "MAX_X", 250)
+    monkeypatch.setattr(fractal, "MAX_Y", 200)
+    fx_min, fx_max, fy_min, fy_max = fractal.default_view("mandelbrot")
+    v = (250 / (fx_max - fx_min), 200 / (fy_max - fy_min), fx_min, fy_min)
+
+    canvas = fractal.Canvas(fractal.pygame.Surface((250, 200)))
+    canvas.clear()
+    for step, x0, a in fractal.progressive("mandelbrot", *v, band=64):
+        canvas.draw(x0, 0, a)
+
+    frame = fractal.frame_np(*v)
+    whole = palette.key_histogram(palette.count_keys(frame, fractal.MAX_CNT), fractal.MAX_CNT)
+    assert (canvas.hist == whole).all()
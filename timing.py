@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Render instrumentation, stage timers and counters
+- off by default, a disabled stage() / count() is one function call
+- summary() prints time per stage and the counters, then starts over
+- save_trace() writes chrome trace event json, open it in chrome://tracing
+  or https://ui.perfetto.dev
+
+    import timing
+    timing.enable()
+    with timing.stage("iterate"):
+        ...
+    timing.count("blits")
+    timing.summary()
+"""
+
+import os
+import json
+import time
+import threading
+
+
+ENABLED = False
+
+_lock = threading.Lock()
+_stages = {} # name: [calls, total sec]
+_counters = {} # name: total
+_events = [] # chrome trace "complete" events
+_threads = {} # tid: thread name for the trace
+_start = time.perf_counter()
+
+
+class _Stage:
+    """times a with block, adds it to the stage totals and the trace"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.s = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add(self.name, self.s, time.perf_counter() - self.s)
+        return False
+
+
+class _NoStage:
+    """stand in when disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+def stage(name):
+    """with timing.stage("flip"): ..."""
+
+    if not ENABLED:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+def add(name, start, sec, track=None):
+    """
+add a stage that was timed somewhere else
+- start = time.perf_counter() at the start, comparable between processes
+- track = trace row name, eg. a producer, default is the calling thread
+    """
+
+    if not ENABLED:
+        return
+
+    if track is None:
+        tid = threading.get_native_id()
+        track = threading.current_thread().name
+    else:
+        tid = "track-" + track
+
+    with _lock:
+        st = _stages.setdefault(name, [0, 0.0])
+        st[0] += 1
+        st[1] += sec
+        _threads[tid] = track
+        _events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": tid,
+                        "ts": (start - _start) * 1e6, "dur": sec * 1e6})
+
+
+def count(name, n=1):
+    """add n to a counter"""
+
+    if not ENABLED:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def reset():
+    """forget the stage times and counters, the trace is kept"""
+
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def summary(title="render"):
+    """print the stage times and counters since the last summary, then reset"""
+
+    with _lock:
+        stages = dict(_stages)
+        counters = dict(_counters)
+        _stages.clear()
+        _counters.clear()
+
+    if not stages and not counters:
+        return
+
+    print("[ {} timing ]".format(title).center(60, "-"))
+    for name, (calls, sec) in sorted(stages.items(), key=lambda v: -v[1][1]):
+        print("{:24} {:8.3f} sec {:8,} calls".format(name, sec, calls))
+    for name, n in sorted(counters.items()):
+        print("{:24} {:14,}".format(name, n))
+
+
+def save_trace(fname):
+    """write the trace events so far as chrome trace json, then clear them"""
+
+    with _lock:
+        events = list(_events)
+        threads = dict(_threads)
+        _events.clear()
+
+    # the trace wants number thread ids, name the rows with metadata events
+    ids = {tid: i for i, tid in enumerate(threads)}
+    for e in events:
+        e["tid"] = ids[e["tid"]]
+    for tid, name in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ids[tid],
+                       "args": {"name": name}})
+
+    with open(fname, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    print("trace saved: {} ({:,} events)".format(fname, len(events)))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+#! -*- coding: utf-8 -*-
+
+"""
+Zoom movie into a point, no window
+- the view shrinks by the same factor every frame, FRAMES_PER_OCTAVE frames
+  per 2x of zoom
+- only one keyframe per 2x is computed, at twice the movie's size, the
+  frames in between are cut out of it and scaled down (bilinear)
+- a keyframe's middle half at half its resolution is the keyframe before
+  it, those pixels (every other one each way) are copied, not computed,
+  so a keyframe costs 3/4 of its pixels
+- frames are written as they are made, memory is two keyframes and a frame
+  however long the movie is
+- past float precision the keyframes are computed with deepzoom.perturb
+
+output from the name:
+  frames/z_{n:05d}.png  one image per frame ({n} = frame number, .png / .bmp / .tga)
+  movie.mp4             piped into ffmpeg as raw rgb24 (.mp4, .mkv, .webm, .avi)
+  -                     raw rgb24 frames on stdout, for any other encoder
+
+$ ./zoom.py -f mandelbrot --center -0.743643887037158704752191506114774 0.131825904205311970493132056385139 --zoom 1e6 -o zoom.mp4
+$ ./zoom.py -f mandelbrot --center -0.7436438870 0.1318259042 --zoom 1000 -s 320x240 -o - | ffplay -f rawvideo -pixel_format rgb24 -video_size 320x240 -
+"""
+
+import os
+import sys
+import math
+import time
+import shutil
+import argparse
+import subprocess
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+import fractal
+import deepzoom
+import palette
+import cmdline
+
+
+FPS = 30
+FRAMES_PER_OCTAVE = 30 # frames per 2x of zoom
+DEEP = 1e-13 # keyframes use perturbation below this pixel size (relative to the center)
+VIDEO = (".mp4", ".mkv", ".webm", ".avi")
+
+
+def keyframe(view, kw, kh, prev=None, max_cnt=None, stats=None):
+    """
+counts for a keyframe of kw x kh pixels (both multiples of 4) at view
+- prev = the keyframe one octave out, its middle half is every other
+  pixel of this one and is copied
+- stats = dict, computed / copied pixels are added up in it
+    """
+
+    if max_cnt is None:
+        max_cnt = fractal.MAX_CNT
+
+    a = np.empty((kw, kh), dtype=np.int32)
+    todo = np.ones((kw, kh), dtype=bool)
+    if prev is not None:
+        a[::2, ::2] = prev[kw // 4:kw // 4 + kw // 2, kh // 4:kh // 4 + kh // 2]
+        todo[::2, ::2] = False
+    gx, gy = np.nonzero(todo)
+
+    if view.dx < abs(float(view.cx)) * DEEP or view.dx < DEEP:
+        a[gx, gy] = deepzoom.perturb(fractal.FRACTAL, gx, gy, view, kw, kh, max_cnt,
+                                     fractal.JULIA_C, fractal.JULIA_ZMAX)
+    else:
+        fx_min = float(view.cx) - kw / 2 * view.dx
+        fy_min = float(view.cy) - kh / 2 * view.dy
+        a[gx, gy] = fractal.fractal_np_map[fractal.FRACTAL](gx, gy, 1 / view.dx, 1 / view.dy, fx_min, fy_min, max_cnt)
+
+    if stats is not None:
+        stats["computed"] = stats.get("computed", 0) + gx.size
+        stats["copied"] = stats.get("copied", 0) + a.size - gx.size
+    return a
+
+
+def resample(rgb, f, w, h):
+    """
+w x h frame showing the middle f (0.5 .. 1) of a keyframe rgb, bilinear
+- f = 1 is the whole keyframe (2:1), f = 0.5 its middle half (1:1)
+    """
+
+    kw, kh = rgb.shape[:2]
+
+    def axis(n, kn):
+        # keyframe coordinate of every frame pixel, split into index and weight.
+        # pixel p of either is sampled at (p - size / 2) * pixel width, so f = 1
+        # lands every frame pixel on a keyframe pixel
+        u = kn / 2 + (np.arange(n) - n / 2) * (kn * f / n)
+        i = np.clip(np.floor(u).astype(np.intp), 0, kn - 2)
+        return i, np.clip(u - i, 0.0, 1.0)
+
+    ix, tx = axis(w, kw)
+    iy, ty = axis(h, kh)
+    tx = tx[:, np.newaxis, np.newaxis]
+    ty = ty[np.newaxis, :, np.newaxis]
+
+    top = rgb[ix][:, iy] * (1 - tx) + rgb[ix + 1][:, iy] * tx
+    bottom = rgb[ix][:, iy + 1] * (1 - tx) + rgb[ix + 1][:, iy + 1] * tx
+    return np.rint(top * (1 - ty) + bottom * ty).astype(np.uint8)
+
+
+class FrameWriter:
+    """
+frames out as they come, images, an ffmpeg pipe or raw rgb24 on stdout
+- frames are (w, h, 3) uint8, x major like pygame.surfarray
+    """
+
+    def __init__(self, out, w, h, fps=FPS):
+        self.out = out
+        self.n = 0
+        self.proc = None
+        self.pipe = None
+
+        # directory of the movie or the frames, before ffmpeg opens it
+        d = os.path.dirname(out.format(n=0) if "{n" in out else out)
+        if d:
+            os.makedirs(d, exist_ok=True)
+
+        ext = os.path.splitext(out)[1].lower()
+        if out == "-":
+            self.pipe = sys.stdout.buffer
+        elif ext in VIDEO:
+            if not shutil.which("ffmpeg"):
+                raise RuntimeError("ffmpeg not found, write frames (-o frames/z_{n:05d}.png) or pipe -o - into an encoder")
+            cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", "{}x{}".format(w, h), "-r", str(fps), "-i", "-", "-pix_fmt", "yuv420p", out]
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+            self.pipe = self.proc.stdin
+        elif "{n" not in out:
+            raise ValueError("frame images need {{n}} in the name: {}".format(out))
+
+    def write(self, frame):
+        if self.pipe:
+            # raw video is row major
+            self.pipe.write(np.ascontiguousarray(frame.transpose(1, 0, 2)).tobytes())
+        else:
+            pygame.image.save(pygame.surfarray.make_surface(frame), self.out.format(n=self.n))
+        self.n += 1
+
+    def close(self):
+        if self.proc:
+            self.proc.stdin.close()
+            self.proc.wait()
+        elif self.pipe:
+            self.pipe.flush()
+
+
+def zoom(view, w, h, frames, writer, per_octave=FRAMES_PER_OCTAVE, name="grey"):
+    """
+frames of a zoom from view (a deepzoom.View of the first frame, w x h)
+toward its center, written to writer, returns stats
+    """
+
+    kw, kh = 2 * w, 2 * h
+    lut = palette.make_lut(name)
+    inside = palette.INSIDE[name]
+    stats = {}
+
+    s = time.perf_counter()
+    key = None
+    key_n = -1
+    for j in range(frames):
+        n, r = divmod(j, per_octave)
+        if n != key_n:
+            # next keyframe, half the size of the last, at twice the movie's resolution
+            kview = deepzoom.View(view.cx, view.cy, view.dx / 2 ** (n + 1), view.dy / 2 ** (n + 1))
+            key = keyframe(kview, kw, kh, key if n == key_n + 1 else None, stats=stats)
+            rgb = palette.colorize(key, lut, fractal.MAX_CNT, inside=inside).astype(np.float32)
+            key_n = n
+            print("keyframe {}: {}, {:.2f} sec".format(n, kview, time.perf_counter() - s), file=sys.stderr, flush=True)
+
+        writer.write(resample(rgb, 2 ** (-r / per_octave), w, h))
+
+    t = time.perf_counter() - s
+    stats["sec"] = t
+    stats["frames"] = frames
+    return stats
+
+
+def even_size(s):
+    """cmdline.size(), both even"""
+
+    w, h = cmdline.size(s)
+    if w % 2 or h % 2:
+        raise argparse.ArgumentTypeError("width and height must be even")
+    return w, h
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="zoom movie toward a point, keyframes at 2x reused frame to frame")
+    parser.add_argument("-f", "--fractal", choices=sorted(fractal.fractal_np_map), default=fractal.FRACTAL)
+    parser.add_argument("-i", "--iterations", type=int, default=fractal.MAX_CNT, help="MAX_CNT")
+    parser.add_argument("-s", "--size", type=even_size, default=(640, 480), help="WIDTHxHEIGHT, even")
+    parser.add_argument("--center", type=cmdline.number, nargs=2, metavar=("X", "Y"), required=True, help="point to zoom into, any number of digits")
+    parser.add_argument("--width", type=float, default=3.0, help="view width of the first frame")
+    parser.add_argument("--zoom", type=float, default=1000.0, help="total zoom factor")
+    parser.add_argument("--per-octave", type=int, default=FRAMES_PER_OCTAVE, help="frames per 2x of zoom")
+    parser.add_argument("--fps", type=int, default=FPS)
+    parser.add_argument("--palette", choices=sorted(palette.PALETTES), default=fractal.PALETTE)
+    parser.add_argument("-o", "--out", default="zoom.mp4", help="frame image pattern with {n}, a video file or - (raw rgb24)")
+    args = parser.parse_args(argv)
+
+    fractal.configure(args.fractal, args.iterations)
+    w, h = args.size
+    dx = args.width / w
+    view = deepzoom.View(args.center[0], args.center[1], dx, dx)
+    frames = int(math.ceil(math.log2(args.zoom) * args.per_octave)) + 1
+
+    writer = FrameWriter(args.out, w, h, args.fps)
+    try:
+        stats = zoom(view, w, h, frames, writer, args.per_octave, args.palette)
+    finally:
+        writer.close()
+
+    # computing every frame would be frames * w * h pixels
+    direct = frames * w * h
+    print("{}: {} frames, {:.1f} sec, {:.1f} frames/sec, {:,} pixels computed ({:,} copied), {:.1%} of computing every frame".format(
+        args.out, frames, stats["sec"], frames / stats["sec"], stats["computed"], stats["copied"],
+        stats["computed"] / direct), file=sys.stderr)
+
+
+if __name__ == '__main__':
+
+    main()
+
+    sys.exit(0)